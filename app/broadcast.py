@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+
+from .db import (
+    RECIPIENT_DEAD,
+    RECIPIENT_FAILED,
+    RECIPIENT_SENT,
+    AsyncDB,
+)
+from .metrics import BROADCAST_MESSAGES, BROADCAST_PROGRESS, BROADCAST_RUNNING
+from .outbound import bulk_traffic
+from .ratelimit import TokenBucket
+from .tips import build_tip_catalogs, tip_catalog
+
+logger = logging.getLogger(__name__)
+
+# (chat_id, tips_index, tips_segment)
+Recipient = Tuple[int, int, Optional[int]]
+
+# Ошибки BadRequest, после которых писать в чат бессмысленно
+DEAD_CHAT_ERRORS = ("chat not found", "user is deactivated", "bot was blocked", "peer_id_invalid")
+
+
+@dataclass
+class BroadcastStats:
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    disabled: int = 0
+    duration: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.sent / self.duration if self.duration > 0 else 0.0
+
+
+class Broadcaster:
+    """
+    Рассылка советов с ограниченным параллелизмом.
+    - свой token bucket: рассылка не занимает больше rate сообщений/сек из общего лимита бота;
+    - запросы идут фоновой полосой OutboundMiddleware — ответы пользователям идут раньше,
+      там же лимит на чат и повторы после RetryAfter;
+    - заблокировавшие бота / удалённые чаты автоматически отписываются;
+    - получатели читаются из задания порциями, результаты (и tips_index) пишутся пачками,
+      поэтому после рестарта задание продолжается с последней контрольной точки;
+    - совет берётся из готового каталога сегмента получателя (см. tips.py).
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        db: AsyncDB,
+        concurrency: int = 20,
+        rate: float = 25.0,
+        chunk_size: int = 1000,
+        batch_size: int = 100,
+    ):
+        self.bot = bot
+        self.db = db
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate)
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+
+        self.stats = BroadcastStats()
+        # (chat_id, статус получателя, новый tips_index)
+        self._results: List[Tuple[int, int, Optional[int]]] = []
+        self._catalogs: Tuple[Tuple[str, ...], ...] = ()
+
+    async def _send(self, chat_id: int, text: str) -> int:
+        """Возвращает статус получателя: RECIPIENT_SENT / RECIPIENT_FAILED / RECIPIENT_DEAD."""
+        # Повторы после RetryAfter и сетевых ошибок делает OutboundMiddleware сессии бота
+        await self.bucket.acquire()
+        try:
+            await self.bot.send_message(chat_id, text)
+            return RECIPIENT_SENT
+        except TelegramForbiddenError:
+            return RECIPIENT_DEAD
+        except TelegramBadRequest as e:
+            if any(err in e.message.lower() for err in DEAD_CHAT_ERRORS):
+                return RECIPIENT_DEAD
+            logger.warning("Tip to %s rejected: %s", chat_id, e.message)
+            return RECIPIENT_FAILED
+        except (TelegramRetryAfter, TelegramNetworkError) as e:
+            logger.warning("Tip to %s not delivered after retries: %s", chat_id, e)
+            return RECIPIENT_FAILED
+        except Exception:
+            logger.exception("Unexpected error sending tip to %s", chat_id)
+            return RECIPIENT_FAILED
+
+    async def _flush(self, job_id: int, force: bool = False) -> None:
+        if self._results and (force or len(self._results) >= self.batch_size):
+            batch, self._results = self._results, []
+            await self.db.mark_broadcast_results(job_id, batch)
+            BROADCAST_PROGRESS.set(self.stats.sent, "sent")
+            BROADCAST_PROGRESS.set(self.stats.failed, "failed")
+            BROADCAST_PROGRESS.set(self.stats.disabled, "disabled")
+
+    async def _worker(self, job_id: int, queue: "asyncio.Queue[Recipient]") -> None:
+        while True:
+            try:
+                chat_id, idx, segment = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            tips = tip_catalog(segment, self._catalogs)
+            status = await self._send(chat_id, tips[idx % len(tips)])
+            if status == RECIPIENT_SENT:
+                self.stats.sent += 1
+                BROADCAST_MESSAGES.inc("sent")
+                self._results.append((chat_id, status, (idx + 1) % len(tips)))
+            else:
+                if status == RECIPIENT_DEAD:
+                    self.stats.disabled += 1
+                    BROADCAST_MESSAGES.inc("disabled")
+                else:
+                    self.stats.failed += 1
+                    BROADCAST_MESSAGES.inc("failed")
+                self._results.append((chat_id, status, None))
+            await self._flush(job_id)
+
+    async def run(self, job_id: int) -> BroadcastStats:
+        started = time.monotonic()
+        after: Optional[int] = None
+        # Каталоги советов по сегментам — один снимок на рассылку, не разбор тегов на получателя
+        self._catalogs = build_tip_catalogs()
+        BROADCAST_RUNNING.set(1)
+        for state in ("total", "sent", "failed", "disabled"):
+            BROADCAST_PROGRESS.set(0, state)
+        try:
+            # Рассылка идёт фоновой полосой: интерактивные ответы её обгоняют
+            with bulk_traffic():
+                while True:
+                    chunk = await self.db.get_broadcast_chunk(job_id, after, self.chunk_size)
+                    if not chunk:
+                        break
+                    after = chunk[-1][0]
+                    self.stats.total += len(chunk)
+                    BROADCAST_PROGRESS.set(self.stats.total, "total")
+
+                    queue: "asyncio.Queue[Recipient]" = asyncio.Queue()
+                    for item in chunk:
+                        queue.put_nowait(item)
+                    workers = [
+                        asyncio.create_task(self._worker(job_id, queue))
+                        for _ in range(min(self.concurrency, len(chunk)))
+                    ]
+                    try:
+                        await asyncio.gather(*workers)
+                    finally:
+                        # Контрольная точка: всё, что уже отправлено, фиксируем даже при отмене
+                        await self._flush(job_id, force=True)
+            await self.db.finish_broadcast_job(job_id)
+        finally:
+            self.stats.duration = time.monotonic() - started
+            BROADCAST_RUNNING.set(0)
+
+        logger.info(
+            "Broadcast #%d done: total=%d sent=%d failed=%d disabled=%d in %.1fs (%.1f msg/s)",
+            job_id,
+            self.stats.total,
+            self.stats.sent,
+            self.stats.failed,
+            self.stats.disabled,
+            self.stats.duration,
+            self.stats.throughput,
+        )
+        return self.stats
+
+
+_broadcast_lock = asyncio.Lock()
+
+
+async def run_broadcasts(bot: Bot, db: AsyncDB, **options) -> None:
+    """
+    Выполняет незавершённые задания: только что созданные (claim_due_tips)
+    и прерванные рестартом. Одновременно выполняется не больше одной рассылки.
+    """
+    async with _broadcast_lock:
+        for job_id in await db.get_unfinished_broadcast_jobs():
+            logger.info("Running broadcast #%d", job_id)
+            await Broadcaster(bot, db, **options).run(job_id)
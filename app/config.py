@@ -2,6 +2,8 @@ import os
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
+from .content import CONTENT_PATH
+
 load_dotenv()
 
 @dataclass(frozen=True)
@@ -11,6 +13,51 @@ class Settings:
     daily_hour: int
     daily_minute: int
     db_path: str
+    sub_cache_ttl: float
+    sub_cache_neg_ttl: float
+    sub_cache_size: int
+    members_recheck_age: float
+    members_recheck_interval: float
+    members_recheck_batch: int
+    members_recheck_rate: float
+    db_durability: str
+    db_flush_interval_ms: int
+    db_flush_max_ops: int
+    db_journal_mode: str
+    db_synchronous: str
+    db_mmap_size: int
+    db_cache_size: int
+    db_temp_store: str
+    db_tips_index: bool
+    broadcast_concurrency: int
+    broadcast_rate: float
+    tips_window_minutes: int
+    fsm_storage: str
+    fsm_cache_size: int
+    fsm_ttl: float
+    fsm_flush_interval_ms: int
+    quiz_mode: str
+    throttle_window_ms: int
+    bot_mode: str
+    webhook_url: str
+    webhook_host: str
+    webhook_port: int
+    webhook_path: str
+    webhook_secret: str
+    webhook_queue_size: int
+    webhook_concurrency: int
+    outbound_rate: float
+    outbound_chat_rate: float
+    outbound_chat_burst: int
+    outbound_max_retries: int
+    outbound_pool_size: int
+    outbound_keepalive: float
+    bot_api_url: str
+    metrics_host: str
+    metrics_port: int
+    content_path: str
+    content_reload_interval: float
+    workers: int
 
 def get_settings() -> Settings:
     token = os.getenv("BOT_TOKEN", "").strip()
@@ -22,10 +69,146 @@ def get_settings() -> Settings:
     daily_minute = int(os.getenv("DAILY_MINUTE", "0"))
     db_path = os.getenv("DB_PATH", "data.sqlite3")
 
+    # Кэш проверки подписки
+    sub_cache_ttl = float(os.getenv("SUB_CACHE_TTL", "300"))
+    sub_cache_neg_ttl = float(os.getenv("SUB_CACHE_NEG_TTL", "15"))
+    sub_cache_size = int(os.getenv("SUB_CACHE_SIZE", "100000"))
+
+    # Сверка локальной таблицы подписчиков канала с API
+    members_recheck_age = float(os.getenv("MEMBERS_RECHECK_AGE", str(7 * 86400)))
+    members_recheck_interval = float(os.getenv("MEMBERS_RECHECK_INTERVAL", "600"))
+    members_recheck_batch = int(os.getenv("MEMBERS_RECHECK_BATCH", "500"))
+    members_recheck_rate = float(os.getenv("MEMBERS_RECHECK_RATE", "5"))
+
+    # Запись в БД: immediate / batched / off
+    db_durability = os.getenv("DB_DURABILITY", "batched").strip().lower()
+    if db_durability not in ("immediate", "batched", "off"):
+        raise RuntimeError("DB_DURABILITY must be one of: immediate, batched, off")
+    db_flush_interval_ms = int(os.getenv("DB_FLUSH_INTERVAL_MS", "50"))
+    db_flush_max_ops = int(os.getenv("DB_FLUSH_MAX_OPS", "500"))
+
+    # Профиль производительности SQLite
+    db_journal_mode = os.getenv("DB_JOURNAL_MODE", "WAL").strip().upper()
+    if db_journal_mode not in ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"):
+        raise RuntimeError("DB_JOURNAL_MODE must be one of: WAL, DELETE, TRUNCATE, PERSIST, MEMORY")
+    db_synchronous = os.getenv("DB_SYNCHRONOUS", "NORMAL").strip().upper()
+    if db_synchronous not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+        raise RuntimeError("DB_SYNCHRONOUS must be one of: OFF, NORMAL, FULL, EXTRA")
+    db_mmap_size = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+    db_cache_size = int(os.getenv("DB_CACHE_SIZE", "-20000"))
+    db_temp_store = os.getenv("DB_TEMP_STORE", "MEMORY").strip().upper()
+    if db_temp_store not in ("DEFAULT", "FILE", "MEMORY"):
+        raise RuntimeError("DB_TEMP_STORE must be one of: DEFAULT, FILE, MEMORY")
+    db_tips_index = os.getenv("DB_TIPS_INDEX", "1").strip() not in ("0", "false", "no")
+
+    # Рассылка советов
+    broadcast_concurrency = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+    broadcast_rate = float(os.getenv("BROADCAST_RATE", "25"))
+    # Советы без своего времени (/tz) расходятся по окну DAILY_HOUR:DAILY_MINUTE + столько минут
+    tips_window_minutes = int(os.getenv("TIPS_WINDOW_MINUTES", "120"))
+
+    # Хранилище состояния квиза (FSM)
+    fsm_storage = os.getenv("FSM_STORAGE", "sqlite").strip().lower()
+    if fsm_storage not in ("sqlite", "memory"):
+        raise RuntimeError("FSM_STORAGE must be one of: sqlite, memory")
+    fsm_cache_size = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+    fsm_ttl = float(os.getenv("FSM_TTL", "86400"))
+    fsm_flush_interval_ms = int(os.getenv("FSM_FLUSH_INTERVAL_MS", "1000"))
+
+    # fsm — ответы в FSM-хранилище, stateless — ответы прямо в callback_data кнопок
+    quiz_mode = os.getenv("QUIZ_MODE", "fsm").strip().lower()
+    if quiz_mode not in ("fsm", "stateless"):
+        raise RuntimeError("QUIZ_MODE must be one of: fsm, stateless")
+
+    # Повторные нажатия той же кнопки в пределах окна схлопываются (0 — выключено)
+    throttle_window_ms = int(os.getenv("THROTTLE_WINDOW_MS", "1000"))
+
+    # Приём апдейтов: polling или webhook
+    bot_mode = os.getenv("BOT_MODE", "polling").strip().lower()
+    if bot_mode not in ("polling", "webhook"):
+        raise RuntimeError("BOT_MODE must be one of: polling, webhook")
+    webhook_url = os.getenv("WEBHOOK_URL", "").strip()
+    if bot_mode == "webhook" and not webhook_url:
+        raise RuntimeError("WEBHOOK_URL is not set")
+    webhook_host = os.getenv("WEBHOOK_HOST", "0.0.0.0").strip()
+    webhook_port = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
+    webhook_path = os.getenv("WEBHOOK_PATH", "/webhook").strip()
+    webhook_secret = os.getenv("WEBHOOK_SECRET", "").strip()
+    webhook_queue_size = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+    webhook_concurrency = int(os.getenv("WEBHOOK_CONCURRENCY", "256"))
+
+    # Исходящие запросы к Bot API: общий лимит, лимит на чат, повторы, пул соединений
+    outbound_rate = float(os.getenv("OUTBOUND_RATE", "28"))
+    outbound_chat_rate = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+    outbound_chat_burst = int(os.getenv("OUTBOUND_CHAT_BURST", "3"))
+    outbound_max_retries = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+    outbound_pool_size = int(os.getenv("OUTBOUND_POOL_SIZE", "100"))
+    outbound_keepalive = float(os.getenv("OUTBOUND_KEEPALIVE", "60"))
+    # Свой сервер Bot API (локальный Bot API server или bench/fake_api.py); пусто — api.telegram.org
+    bot_api_url = os.getenv("BOT_API_URL", "").strip()
+
+    # Метрики в формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics (0 — выключены)
+    metrics_host = os.getenv("METRICS_HOST", "127.0.0.1").strip()
+    metrics_port = int(os.getenv("METRICS_PORT", "0"))
+
+    # Бандл контента (советы, фото-примеры, тексты плана); перечитывается по SIGHUP и при изменении
+    content_path = os.getenv("CONTENT_PATH", "").strip() or CONTENT_PATH
+    content_reload_interval = float(os.getenv("CONTENT_RELOAD_INTERVAL", "30"))
+
+    # Количество процессов-воркеров (1 — всё в одном процессе)
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1 and db_journal_mode != "WAL":
+        raise RuntimeError("WORKERS > 1 requires DB_JOURNAL_MODE=WAL")
+
     return Settings(
         bot_token=token,
         tz=tz,
         daily_hour=daily_hour,
         daily_minute=daily_minute,
         db_path=db_path,
+        sub_cache_ttl=sub_cache_ttl,
+        sub_cache_neg_ttl=sub_cache_neg_ttl,
+        sub_cache_size=sub_cache_size,
+        members_recheck_age=members_recheck_age,
+        members_recheck_interval=members_recheck_interval,
+        members_recheck_batch=members_recheck_batch,
+        members_recheck_rate=members_recheck_rate,
+        db_durability=db_durability,
+        db_flush_interval_ms=db_flush_interval_ms,
+        db_flush_max_ops=db_flush_max_ops,
+        db_journal_mode=db_journal_mode,
+        db_synchronous=db_synchronous,
+        db_mmap_size=db_mmap_size,
+        db_cache_size=db_cache_size,
+        db_temp_store=db_temp_store,
+        db_tips_index=db_tips_index,
+        broadcast_concurrency=broadcast_concurrency,
+        broadcast_rate=broadcast_rate,
+        tips_window_minutes=tips_window_minutes,
+        fsm_storage=fsm_storage,
+        fsm_cache_size=fsm_cache_size,
+        fsm_ttl=fsm_ttl,
+        fsm_flush_interval_ms=fsm_flush_interval_ms,
+        quiz_mode=quiz_mode,
+        throttle_window_ms=throttle_window_ms,
+        bot_mode=bot_mode,
+        webhook_url=webhook_url,
+        webhook_host=webhook_host,
+        webhook_port=webhook_port,
+        webhook_path=webhook_path,
+        webhook_secret=webhook_secret,
+        webhook_queue_size=webhook_queue_size,
+        webhook_concurrency=webhook_concurrency,
+        outbound_rate=outbound_rate,
+        outbound_chat_rate=outbound_chat_rate,
+        outbound_chat_burst=outbound_chat_burst,
+        outbound_max_retries=outbound_max_retries,
+        outbound_pool_size=outbound_pool_size,
+        outbound_keepalive=outbound_keepalive,
+        bot_api_url=bot_api_url,
+        metrics_host=metrics_host,
+        metrics_port=metrics_port,
+        content_path=content_path,
+        content_reload_interval=content_reload_interval,
+        workers=workers,
     )
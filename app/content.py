@@ -1,57 +1,97 @@
-# 30 ежедневных микро-советов
-DAILY_TIPS = [
-    "💡 Не тестируй тон на руке — лучше на линии челюсти.",
-    "💡 Лёгкий тон выглядит лучше, чем плотный — даже на проблемной коже.",
-    "💡 Румяна освежают сильнее, чем бронзер (особенно новичкам).",
-    "💡 Если веко нависшее — растушёвка должна уходить чуть выше складки.",
-    "💡 Брови не должны быть темнее корней волос.",
-    "💡 Консилер под глаза наноси тонким слоем — меньше = лучше.",
-    "💡 Кремовые продукты обычно выглядят более естественно.",
-    "💡 Сильная матовость может “состарить” — лёгкое сияние свежее.",
-    "💡 Если стрелка не даётся — сделай мягкую стрелку тенями.",
-    "💡 Нюд на губах — самый безопасный вариант на каждый день.",
-    "💡 Перед тоном всегда увлажняй кожу.",
-    "💡 Румяна выше скулы дают лифтинг-эффект.",
-    "💡 Тушь лучше в 2 тонких слоя, чем в 1 толстый.",
-    "💡 Светлые тени визуально увеличивают глаза.",
-    "💡 Не смешивай много текстур — выбирай 1–2 акцента.",
-    "💡 Лучше недокрасить, чем перекрасить.",
-    "💡 Макияж подчёркивает черты, а не “меняет лицо”.",
-    "💡 Если блеск — сначала салфетка, потом немного пудры (только Т-зона).",
-    "💡 Помада выглядит аккуратнее с лёгким контуром карандашом.",
-    "💡 Чем проще макияж — тем “дороже” он смотрится.",
-    "💡 Один акцент: либо глаза, либо губы.",
-    "💡 Не бойся румян — бойся серого лица без них.",
-    "💡 Тон должен совпадать с шеей — это правило №1.",
-    "💡 Макияж при дневном свете — самый честный.",
-    "💡 Растушёвка важнее дорогих продуктов.",
-    "💡 Слишком тёмные тени могут уменьшать глаза.",
-    "💡 Лёгкий блеск на губах освежает образ.",
-    "💡 Не копируй чужой макияж — адаптируй под себя.",
-    "💡 Макияж — это инструмент, а не маска.",
-    "💡 Если сомневаешься — выбирай нюд и чистую кожу.",
-]
-
-# 10 наборов “фото-примеров” как ссылки (поисковые запросы)
-PHOTO_SETS = {
-    1: ["natural nude makeup look", "everyday natural makeup", "soft nude makeup face"],
-    2: ["romantic makeup date", "soft pink makeup look", "peach makeup natural"],
-    3: ["soft glam makeup look", "evening party makeup", "golden brown eye makeup"],
-    4: ["makeup for photoshoot natural", "camera ready makeup look", "matte nude makeup portrait"],
-    5: ["hooded eyes makeup soft", "hooded eyes natural makeup", "hooded eyes eyeshadow tutorial"],
-    6: ["small eyes makeup look", "bright eyeshadow small eyes", "natural makeup small eyes"],
-    7: ["warm tone makeup look", "peach makeup look", "warm nude makeup"],
-    8: ["cool tone makeup look", "pink makeup look", "cool nude makeup"],
-    9: ["matte natural makeup", "oil control makeup look", "natural matte makeup face"],
-    10:["dewy makeup look", "glowy skin makeup", "hydrating makeup look"],
-}
-
-def image_links_for_set(set_id: int) -> str:
+import json
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, Tuple
+
+from .rules import Fields, Rules, compile_rules
+
+# Весь контент бота — советы, наборы фото-примеров и тексты плана (rules) — в одном
+# версионированном файле. Его можно менять без рестарта: см. contentwatch.py.
+CONTENT_PATH = os.path.join(os.path.dirname(__file__), "content.json")
+
+# Набор фото по умолчанию (для неизвестных set_id)
+DEFAULT_PHOTO_SET = 1
+
+
+@dataclass(frozen=True)
+class ContentBundle:
+    """Проверенный и «скомпилированный» контент; после загрузки не меняется."""
+    version: int
+    # Общие ежедневные советы
+    daily_tips: Tuple[str, ...]
+    # Советы под ответы квиза: ({поле: допустимые варианты}, текст); поле без тега подходит всем
+    segment_tips: Tuple[Tuple[Mapping[str, FrozenSet[str]], str], ...]
+    # set_id -> поисковые запросы и готовый текст со ссылками
+    photo_sets: Mapping[int, Tuple[str, ...]]
+    photo_links: Mapping[int, str]
+    rules: Rules
+
+
+def _strings(value: Any, where: str) -> Tuple[str, ...]:
+    if not isinstance(value, list) or not value or not all(isinstance(s, str) and s for s in value):
+        raise ValueError(f"{where} must be a non-empty list of strings")
+    return tuple(value)
+
+
+def _photo_links(queries: Tuple[str, ...]) -> str:
     # Ссылки на выдачу Google Images (можно заменить на Яндекс/Пинтерест)
     # В Telegram это будет кликабельно.
-    qs = PHOTO_SETS.get(set_id, PHOTO_SETS[1])
     lines = []
-    for q in qs:
+    for q in queries:
         query = q.replace(" ", "+")
         lines.append(f"• Пример: https://www.google.com/search?tbm=isch&q={query}")
     return "\n".join(lines)
+
+
+def compile_bundle(doc: Any, fields: Fields) -> ContentBundle:
+    """Разобранный content.json -> ContentBundle; ValueError с указанием места ошибки."""
+    if not isinstance(doc, dict) or type(doc.get("version")) is not int:
+        raise ValueError("Content bundle must be an object with an integer 'version'")
+    options = dict(fields)
+
+    segment_tips = []
+    raw_tips = doc.get("segment_tips", [])
+    if not isinstance(raw_tips, list):
+        raise ValueError("segment_tips must be a list")
+    for i, tip in enumerate(raw_tips):
+        where = f"segment_tips[{i}]"
+        if not isinstance(tip, dict) or set(tip) != {"if", "then"} or not isinstance(tip["then"], str):
+            raise ValueError(f"{where}: expected {{'if': {{...}}, 'then': text}}")
+        if not isinstance(tip["if"], dict):
+            raise ValueError(f"{where}.if must be an object")
+        tags: Dict[str, FrozenSet[str]] = {}
+        for name, values in tip["if"].items():
+            if name not in options:
+                raise ValueError(f"{where}: unknown field {name!r}")
+            unknown = set(_strings(values, f"{where}.if.{name}")) - set(options[name])
+            if unknown:
+                raise ValueError(f"{where}: unknown {name} {sorted(unknown)}")
+            tags[name] = frozenset(values)
+        segment_tips.append((MappingProxyType(tags), tip["then"]))
+
+    raw_sets = doc.get("photo_sets")
+    if not isinstance(raw_sets, dict):
+        raise ValueError("photo_sets must be an object")
+    photo_sets: Dict[int, Tuple[str, ...]] = {}
+    for key, queries in raw_sets.items():
+        if not key.isdigit():
+            raise ValueError(f"photo_sets: set id must be a number, got {key!r}")
+        photo_sets[int(key)] = _strings(queries, f"photo_sets[{key}]")
+    if DEFAULT_PHOTO_SET not in photo_sets:
+        raise ValueError(f"photo_sets must contain the default set {DEFAULT_PHOTO_SET}")
+
+    return ContentBundle(
+        version=doc["version"],
+        daily_tips=_strings(doc.get("daily_tips"), "daily_tips"),
+        segment_tips=tuple(segment_tips),
+        photo_sets=MappingProxyType(photo_sets),
+        photo_links=MappingProxyType({k: _photo_links(v) for k, v in photo_sets.items()}),
+        rules=compile_rules(doc, fields, photo_sets=photo_sets),
+    )
+
+
+def load_bundle(fields: Fields, path: str = CONTENT_PATH) -> ContentBundle:
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    return compile_bundle(doc, fields)
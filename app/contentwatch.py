@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import os
+import signal
+from typing import Optional
+
+from .content import CONTENT_PATH
+from .logic import build_text_table, content_bundle, reload_content
+from .tips import build_tip_catalogs
+
+logger = logging.getLogger(__name__)
+
+
+class ContentWatcher:
+    """
+    Перезагрузка бандла контента без рестарта: по SIGHUP и по изменению файла
+    (mtime проверяется раз в interval секунд; 0 — только по сигналу).
+    Новый бандл проверяется целиком до подмены; если он битый или версия не выросла,
+    остаётся текущий. Подключается через dp.startup / dp.shutdown.
+    """
+
+    def __init__(self, path: str = CONTENT_PATH, interval: float = 30.0):
+        self.path = path
+        self.interval = interval
+        self._mtime = self._stat()
+        self._task: Optional[asyncio.Task] = None
+        self._signal = False
+
+    def _stat(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self) -> bool:
+        self._mtime = self._stat()
+        current = content_bundle().version
+        try:
+            bundle = reload_content(self.path)
+        except (OSError, ValueError) as e:
+            logger.error("Content reload from %s failed, keeping version %d: %s", self.path, current, e)
+            return False
+        # Таблицы текстов и каталоги советов — сразу, чтобы первый пользователь не ждал
+        build_text_table()
+        build_tip_catalogs()
+        logger.info("Content version %d loaded from %s (was %d)", bundle.version, self.path, current)
+        return True
+
+    def check(self) -> bool:
+        if self._stat() == self._mtime:
+            return False
+        return self.reload()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                # Неожиданная ошибка не должна останавливать наблюдение за файлом
+                logger.exception("Content check of %s failed", self.path)
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, self.reload)
+            self._signal = True
+        except (AttributeError, NotImplementedError, RuntimeError):  # Windows / не главный поток
+            pass
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._signal:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._signal = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,5 +1,253 @@
+import asyncio
+import json
+import logging
 import sqlite3
-from typing import Optional
+import time
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .logic import Answers, encode_answers, tip_segment_of_code
+from .metrics import DB_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Колонки users, которые можно менять через отложенную запись (apply_batch)
+USER_COLUMNS = (
+    "tips_enabled",
+    "tips_index",
+    "last_result",
+    "last_answers",
+    "last_answers_code",
+    "saved_answers_code",
+    "saved_level",
+    "saved_version",
+    "tips_tz",
+    "tips_minute",
+    "next_tip_at",
+    "tips_segment",
+)
+
+DURABILITY_MODES = ("immediate", "batched", "off")
+
+
+@dataclass(frozen=True)
+class DBProfile:
+    """Настройки производительности SQLite (применяются в DB.init)."""
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size: int = -20000  # отрицательное значение — в КиБ (≈20 МБ)
+    temp_store: str = "MEMORY"
+    tips_index: bool = True
+
+
+# ===== Migrations =====
+# Версия схемы хранится в PRAGMA user_version; каждая миграция выполняется один раз.
+
+def _migration_1_users(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            chat_id INTEGER PRIMARY KEY,
+            tips_enabled INTEGER NOT NULL DEFAULT 0,
+            tips_index INTEGER NOT NULL DEFAULT 0,
+            last_result TEXT,
+            last_answers TEXT
+        );
+        """
+    )
+    # Базы, созданные до появления last_answers (user_version у них ещё 0)
+    cols = [r["name"] for r in cur.execute("PRAGMA table_info(users);").fetchall()]
+    if "last_answers" not in cols:
+        cur.execute("ALTER TABLE users ADD COLUMN last_answers TEXT;")
+
+
+def _migration_2_broadcast_jobs(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            job_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'running',
+            created_at REAL NOT NULL,
+            finished_at REAL
+        );
+        """
+    )
+    # status: 0 — ждёт отправки, 1 — отправлено, 2 — ошибка, 3 — чат недоступен
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_recipients (
+            job_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            tips_index INTEGER NOT NULL,
+            status INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (job_id, chat_id)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+def answers_code_from_json(raw: Optional[str]) -> Optional[int]:
+    """Старый формат last_answers (JSON) -> упакованный код ответов."""
+    if not raw:
+        return None
+    try:
+        data = json.loads(raw)
+        return encode_answers(
+            Answers(
+                skin=data["skin"],
+                tone=data["tone"],
+                undertone=data["undertone"],
+                eyes=data["eyes"],
+                occasion=data["occasion"],
+            )
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _migration_3_answers_code(cur: sqlite3.Cursor) -> None:
+    # Ответы храним одним INTEGER вместо JSON-текста
+    cur.execute("ALTER TABLE users ADD COLUMN last_answers_code INTEGER;")
+    rows = cur.execute(
+        "SELECT chat_id, last_answers FROM users WHERE last_answers IS NOT NULL;"
+    ).fetchall()
+    converted = []
+    for r in rows:
+        code = answers_code_from_json(r["last_answers"])
+        if code is not None:
+            converted.append((code, r["chat_id"]))
+    cur.executemany(
+        "UPDATE users SET last_answers_code=?, last_answers=NULL WHERE chat_id=?;", converted
+    )
+
+
+def _migration_4_saved_plan_ref(cur: sqlite3.Cursor) -> None:
+    # Сохранённый план храним ссылкой (ответы + уровень + версия), а не готовым текстом
+    cur.execute("ALTER TABLE users ADD COLUMN saved_answers_code INTEGER;")
+    cur.execute("ALTER TABLE users ADD COLUMN saved_level INTEGER;")
+    cur.execute("ALTER TABLE users ADD COLUMN saved_version INTEGER;")
+
+
+def _migration_5_fsm_states(cur: sqlite3.Cursor) -> None:
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID;
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states(updated_at);")
+
+
+def _migration_6_channel_members(cur: sqlite3.Cursor) -> None:
+    # Локальная копия подписки на канал: обновляется из chat_member-апдейтов и сверкой с API
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS channel_members (
+            user_id INTEGER PRIMARY KEY,
+            is_member INTEGER NOT NULL,
+            checked_at REAL NOT NULL
+        );
+        """
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_channel_members_checked ON channel_members(checked_at);"
+    )
+
+
+def _migration_7_tips_schedule(cur: sqlite3.Cursor) -> None:
+    # Время доставки совета у каждого пользователя своё:
+    # tips_tz/tips_minute — заданные пользователем пояс и минута суток (NULL — по умолчанию),
+    # next_tip_at — следующая отправка в UTC, в минутах от эпохи (NULL — ещё не рассчитана)
+    cur.execute("ALTER TABLE users ADD COLUMN tips_tz TEXT;")
+    cur.execute("ALTER TABLE users ADD COLUMN tips_minute INTEGER;")
+    cur.execute("ALTER TABLE users ADD COLUMN next_tip_at INTEGER;")
+    # Каждую минуту планировщик берёт из индекса только тех, чьё время подошло
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_next_tip ON users(next_tip_at) WHERE tips_enabled=1;"
+    )
+
+
+def _migration_8_tips_segment(cur: sqlite3.Cursor) -> None:
+    # Сегмент советов (кожа/подтон/глаза/повод) из последних ответов; NULL — общие советы.
+    # Получатель задания несёт сегмент в снимке, как и tips_index
+    cur.execute("ALTER TABLE users ADD COLUMN tips_segment INTEGER;")
+    cur.execute("ALTER TABLE broadcast_recipients ADD COLUMN tips_segment INTEGER;")
+    rows = cur.execute(
+        "SELECT chat_id, last_answers_code FROM users WHERE last_answers_code IS NOT NULL;"
+    ).fetchall()
+    cur.executemany(
+        "UPDATE users SET tips_segment=? WHERE chat_id=?;",
+        [(tip_segment_of_code(r["last_answers_code"]), r["chat_id"]) for r in rows],
+    )
+
+
+MIGRATIONS = [
+    (1, _migration_1_users),
+    (2, _migration_2_broadcast_jobs),
+    (3, _migration_3_answers_code),
+    (4, _migration_4_saved_plan_ref),
+    (5, _migration_5_fsm_states),
+    (6, _migration_6_channel_members),
+    (7, _migration_7_tips_schedule),
+    (8, _migration_8_tips_segment),
+]
+
+# Для пересчёта next_tip_at: (now_minute, chat_id, tips_tz, tips_minute) -> новое next_tip_at
+Reschedule = Callable[[int, int, Optional[str], Optional[int]], int]
+
+
+class SavedPlan(NamedTuple):
+    answers_code: Optional[int]
+    level: Optional[int]
+    version: Optional[int]
+    # Текст из старых записей (до хранения ссылкой)
+    text: Optional[str]
+
+
+RECIPIENT_PENDING = 0
+RECIPIENT_SENT = 1
+RECIPIENT_FAILED = 2
+RECIPIENT_DEAD = 3
+
+
+class KnownUsers:
+    """
+    Реестр уже существующих chat_id, чтобы не делать INSERT на каждый апдейт.
+    Загруженные при старте id лежат в компактном отсортированном array('q'),
+    новые — в небольшом set, который периодически вливается в массив.
+    """
+
+    MERGE_THRESHOLD = 10_000
+
+    def __init__(self, chat_ids: Iterable[int] = ()):
+        self._base = array("q", sorted(chat_ids))
+        self._new: Set[int] = set()
+
+    def __contains__(self, chat_id: int) -> bool:
+        if chat_id in self._new:
+            return True
+        i = bisect_left(self._base, chat_id)
+        return i < len(self._base) and self._base[i] == chat_id
+
+    def add(self, chat_id: int) -> None:
+        if chat_id in self:
+            return
+        self._new.add(chat_id)
+        if len(self._new) >= self.MERGE_THRESHOLD:
+            self._base = array("q", sorted([*self._base, *self._new]))
+            self._new.clear()
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._new)
 
 
 class DB:
@@ -8,43 +256,88 @@ class DB:
         self.conn = sqlite3.connect(self.path)
         self.conn.row_factory = sqlite3.Row
 
-    def init(self) -> None:
-        cur = self.conn.cursor()
+    def init(self, profile: Optional[DBProfile] = None, synchronous: Optional[str] = None) -> None:
+        profile = profile or DBProfile()
+        self.apply_profile(profile, synchronous)
+        self.migrate()
 
-        # Создаём таблицу (с колонкой last_answers)
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                chat_id INTEGER PRIMARY KEY,
-                tips_enabled INTEGER NOT NULL DEFAULT 0,
-                tips_index INTEGER NOT NULL DEFAULT 0,
-                last_result TEXT,
-                last_answers TEXT
-            );
-            """
-        )
+        cur = self.conn.cursor()
+        # Частичный индекс для ежедневной рассылки (только подписанные на советы)
+        if profile.tips_index:
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS idx_users_tips_enabled "
+                "ON users(chat_id, tips_index) WHERE tips_enabled=1;"
+            )
+        else:
+            cur.execute("DROP INDEX IF EXISTS idx_users_tips_enabled;")
         self.conn.commit()
 
-        # Миграция для старых баз (если ранее таблица была без last_answers)
-        cols = [r["name"] for r in cur.execute("PRAGMA table_info(users);").fetchall()]
-        if "last_answers" not in cols:
-            cur.execute("ALTER TABLE users ADD COLUMN last_answers TEXT;")
-            self.conn.commit()
+    def apply_profile(self, profile: DBProfile, synchronous: Optional[str] = None) -> None:
+        cur = self.conn.cursor()
+        cur.execute(f"PRAGMA journal_mode={profile.journal_mode};")
+        cur.execute(f"PRAGMA synchronous={synchronous or profile.synchronous};")
+        cur.execute(f"PRAGMA mmap_size={int(profile.mmap_size)};")
+        cur.execute(f"PRAGMA cache_size={int(profile.cache_size)};")
+        cur.execute(f"PRAGMA temp_store={profile.temp_store};")
+
+    def schema_version(self) -> int:
+        return int(self.conn.execute("PRAGMA user_version;").fetchone()[0])
+
+    def migrate(self) -> None:
+        current = self.schema_version()
+        for version, migration in MIGRATIONS:
+            if version <= current:
+                continue
+            cur = self.conn.cursor()
+            # IMMEDIATE — сразу берём блокировку записи: при WORKERS>1 миграции запускает
+            # каждый процесс, и версию нужно перечитать уже под блокировкой
+            cur.execute("BEGIN IMMEDIATE;")
+            if self.schema_version() >= version:
+                self.conn.rollback()
+                current = self.schema_version()
+                continue
+            try:
+                migration(cur)
+                cur.execute(f"PRAGMA user_version={version};")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            current = version
 
     def ensure_user(self, chat_id: int) -> None:
         cur = self.conn.cursor()
         cur.execute("INSERT OR IGNORE INTO users(chat_id) VALUES (?);", (chat_id,))
         self.conn.commit()
 
-    # ---------- Tips ----------
-    def set_tips(self, chat_id: int, enabled: bool) -> None:
+    def get_all_chat_ids(self) -> List[int]:
+        cur = self.conn.cursor()
+        return [int(r[0]) for r in cur.execute("SELECT chat_id FROM users;")]
+
+    def _upsert(self, chat_id: int, **cols: Any) -> None:
+        # Создание пользователя совмещено с первой реальной записью
+        unknown = set(cols) - set(USER_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown users columns: {sorted(unknown)}")
+        names = ", ".join(cols)
+        placeholders = ", ".join("?" for _ in cols)
+        assignments = ", ".join(f"{name}=excluded.{name}" for name in cols)
         cur = self.conn.cursor()
         cur.execute(
-            "UPDATE users SET tips_enabled=? WHERE chat_id=?;",
-            (1 if enabled else 0, chat_id),
+            f"INSERT INTO users(chat_id, {names}) VALUES (?, {placeholders}) "
+            f"ON CONFLICT(chat_id) DO UPDATE SET {assignments};",
+            (chat_id, *cols.values()),
         )
         self.conn.commit()
 
+    # ---------- Tips ----------
+    def set_tips(self, chat_id: int, enabled: bool) -> None:
+        if enabled:
+            # Время следующего совета рассчитает планировщик
+            self._upsert(chat_id, tips_enabled=1, next_tip_at=None)
+        else:
+            self._upsert(chat_id, tips_enabled=0)
+
     def get_tips_enabled(self, chat_id: int) -> bool:
         cur = self.conn.cursor()
         row = cur.execute(
@@ -67,11 +360,192 @@ class DB:
         )
         self.conn.commit()
 
+    def set_tips_time(self, chat_id: int, tz: Optional[str], minute: Optional[int]) -> None:
+        self._upsert(chat_id, tips_tz=tz, tips_minute=minute, next_tip_at=None)
+
+    def get_tips_time(self, chat_id: int) -> Tuple[Optional[str], Optional[int]]:
+        cur = self.conn.cursor()
+        row = cur.execute(
+            "SELECT tips_tz, tips_minute FROM users WHERE chat_id=?;", (chat_id,)
+        ).fetchone()
+        return (row["tips_tz"], row["tips_minute"]) if row else (None, None)
+
+    def schedule_tips(self, now_minute: int, reschedule: Reschedule, limit: int = 5000) -> int:
+        """Рассчитывает next_tip_at для подписанных, у которых его ещё нет (до limit за раз)."""
+        cur = self.conn.cursor()
+        with self.conn:
+            rows = cur.execute(
+                "SELECT chat_id, tips_tz, tips_minute FROM users "
+                "WHERE tips_enabled=1 AND next_tip_at IS NULL LIMIT ?;",
+                (limit,),
+            ).fetchall()
+            cur.executemany(
+                "UPDATE users SET next_tip_at=? WHERE chat_id=?;",
+                [
+                    (reschedule(now_minute, r["chat_id"], r["tips_tz"], r["tips_minute"]), r["chat_id"])
+                    for r in rows
+                ],
+            )
+        return len(rows)
+
+    def start_tips_job(self, name: str, now_minute: int, keep_days: int = 7) -> Optional[int]:
+        """
+        Задание рассылки на минуту now_minute (получателей добавляет claim_tips_chunk).
+        Задание с тем же именем уже есть — возвращаем его: прерванный захват продолжится.
+        None — в эту минуту отправлять некому.
+        """
+        cur = self.conn.cursor()
+        with self.conn:
+            row = cur.execute(
+                "SELECT job_id FROM broadcast_jobs WHERE name=?;", (name,)
+            ).fetchone()
+            if row:
+                return int(row["job_id"])
+            due = cur.execute(
+                "SELECT 1 FROM users WHERE tips_enabled=1 AND next_tip_at <= ? LIMIT 1;",
+                (now_minute,),
+            ).fetchone()
+            if not due:
+                return None
+
+            now = time.time()
+            # Чистим давно завершённые задания вместе с получателями
+            cur.execute(
+                "DELETE FROM broadcast_recipients WHERE job_id IN ("
+                "SELECT job_id FROM broadcast_jobs WHERE status='done' AND finished_at < ?);",
+                (now - keep_days * 86400,),
+            )
+            cur.execute(
+                "DELETE FROM broadcast_jobs WHERE status='done' AND finished_at < ?;",
+                (now - keep_days * 86400,),
+            )
+            cur.execute(
+                "INSERT INTO broadcast_jobs(name, created_at) VALUES (?, ?);", (name, now)
+            )
+            return int(cur.lastrowid)
+
+    def claim_tips_chunk(
+        self,
+        job_id: int,
+        now_minute: int,
+        reschedule: Reschedule,
+        after_chat_id: Optional[int],
+        limit: int,
+    ) -> Optional[int]:
+        """
+        Следующие до limit пользователей (по chat_id), чьё next_tip_at наступило: снимок
+        в получатели задания (INSERT ... SELECT) и перенос next_tip_at — одной короткой
+        транзакцией, так что пользователь либо попал в задание и перенесён, либо ни то ни другое.
+        Возвращает последний chat_id порции; None — больше никого.
+        """
+        lower = after_chat_id if after_chat_id is not None else -(2 ** 63)
+        cur = self.conn.cursor()
+        with self.conn:
+            rows = cur.execute(
+                "SELECT chat_id, tips_tz, tips_minute FROM users "
+                "WHERE tips_enabled=1 AND next_tip_at <= ? AND chat_id > ? "
+                "ORDER BY chat_id LIMIT ?;",
+                (now_minute, lower, limit),
+            ).fetchall()
+            if not rows:
+                return None
+            last = int(rows[-1]["chat_id"])
+            cur.execute(
+                "INSERT OR IGNORE INTO broadcast_recipients(job_id, chat_id, tips_index, tips_segment) "
+                "SELECT ?, chat_id, tips_index, tips_segment FROM users "
+                "WHERE tips_enabled=1 AND next_tip_at <= ? AND chat_id > ? AND chat_id <= ?;",
+                (job_id, now_minute, lower, last),
+            )
+            cur.executemany(
+                "UPDATE users SET next_tip_at=? WHERE chat_id=?;",
+                [
+                    (reschedule(now_minute, r["chat_id"], r["tips_tz"], r["tips_minute"]), r["chat_id"])
+                    for r in rows
+                ],
+            )
+        return last
+
+    def claim_due_tips(
+        self, name: str, now_minute: int, reschedule: Reschedule, limit: int = 5000
+    ) -> Optional[int]:
+        """
+        Задание рассылки из пользователей, чьё next_tip_at уже наступило, с переносом
+        next_tip_at на следующий раз (порциями по limit, см. claim_tips_chunk).
+        Отправка дальше идёт по снимку получателей задания (с докаткой после рестарта),
+        поэтому повторно те же пользователи в следующую минуту не попадут.
+        None — в эту минуту отправлять некому.
+        """
+        job_id = self.start_tips_job(name, now_minute)
+        if job_id is None:
+            return None
+        after: Optional[int] = None
+        while True:
+            after = self.claim_tips_chunk(job_id, now_minute, reschedule, after, limit)
+            if after is None:
+                return job_id
+
+    # ---------- Broadcast jobs ----------
+    def get_unfinished_broadcast_jobs(self) -> List[int]:
+        cur = self.conn.cursor()
+        rows = cur.execute(
+            "SELECT job_id FROM broadcast_jobs WHERE status='running' ORDER BY job_id;"
+        ).fetchall()
+        return [int(r["job_id"]) for r in rows]
+
+    def get_broadcast_chunk(
+        self, job_id: int, after_chat_id: Optional[int], limit: int
+    ) -> List[Tuple[int, int, Optional[int]]]:
+        """
+        Следующая порция ожидающих получателей (keyset-пагинация по chat_id):
+        (chat_id, tips_index, tips_segment).
+        """
+        cur = self.conn.cursor()
+        rows = cur.execute(
+            "SELECT r.chat_id, r.tips_index, r.tips_segment FROM broadcast_recipients r "
+            "JOIN users u ON u.chat_id = r.chat_id AND u.tips_enabled = 1 "
+            "WHERE r.job_id=? AND r.status=0 AND r.chat_id > ? "
+            "ORDER BY r.chat_id LIMIT ?;",
+            (job_id, after_chat_id if after_chat_id is not None else -(2 ** 63), limit),
+        ).fetchall()
+        return [(int(r["chat_id"]), int(r["tips_index"]), r["tips_segment"]) for r in rows]
+
+    def mark_broadcast_results(
+        self, job_id: int, results: List[Tuple[int, int, Optional[int]]]
+    ) -> None:
+        """
+        results: (chat_id, status, новый tips_index или None).
+        Статус получателя и tips_index/tips_enabled пользователя меняются одной транзакцией.
+        """
+        cur = self.conn.cursor()
+        with self.conn:
+            cur.executemany(
+                "UPDATE broadcast_recipients SET status=? WHERE job_id=? AND chat_id=?;",
+                [(status, job_id, chat_id) for chat_id, status, _ in results],
+            )
+            cur.executemany(
+                "UPDATE users SET tips_index=? WHERE chat_id=?;",
+                [
+                    (new_index, chat_id)
+                    for chat_id, status, new_index in results
+                    if status == RECIPIENT_SENT and new_index is not None
+                ],
+            )
+            cur.executemany(
+                "UPDATE users SET tips_enabled=0 WHERE chat_id=?;",
+                [(chat_id,) for chat_id, status, _ in results if status == RECIPIENT_DEAD],
+            )
+
+    def finish_broadcast_job(self, job_id: int) -> None:
+        cur = self.conn.cursor()
+        with self.conn:
+            cur.execute(
+                "UPDATE broadcast_jobs SET status='done', finished_at=? WHERE job_id=?;",
+                (time.time(), job_id),
+            )
+
     # ---------- Save result text ----------
     def save_last_result(self, chat_id: int, text: str) -> None:
-        cur = self.conn.cursor()
-        cur.execute("UPDATE users SET last_result=? WHERE chat_id=?;", (text, chat_id))
-        self.conn.commit()
+        self._upsert(chat_id, last_result=text, saved_answers_code=None)
 
     def get_last_result(self, chat_id: int) -> Optional[str]:
         cur = self.conn.cursor()
@@ -80,21 +554,428 @@ class DB:
         ).fetchone()
         return row["last_result"] if row else None
 
-    # ---------- Save last answers payload (for "Подробнее") ----------
-    def save_last_answers(self, chat_id: int, answers_json: str) -> None:
+    # ---------- Saved plan (by reference) ----------
+    def save_plan(self, chat_id: int, answers_code: int, level: int, version: int) -> None:
+        self._upsert(
+            chat_id,
+            saved_answers_code=answers_code,
+            saved_level=level,
+            saved_version=version,
+            last_result=None,
+        )
+
+    def get_saved_plan(self, chat_id: int) -> Optional[SavedPlan]:
         cur = self.conn.cursor()
-        cur.execute(
-            "UPDATE users SET last_answers=? WHERE chat_id=?;",
-            (answers_json, chat_id),
+        row = cur.execute(
+            "SELECT saved_answers_code, saved_level, saved_version, last_result "
+            "FROM users WHERE chat_id=?;",
+            (chat_id,),
+        ).fetchone()
+        if not row:
+            return None
+        return SavedPlan(
+            answers_code=row["saved_answers_code"],
+            level=row["saved_level"],
+            version=row["saved_version"],
+            text=row["last_result"],
         )
-        self.conn.commit()
 
-    def get_last_answers(self, chat_id: int) -> Optional[str]:
+    # ---------- Save last answers payload (for "Подробнее") ----------
+    def save_last_answers(self, chat_id: int, answers_code: int) -> None:
+        # Сегмент советов меняется вместе с ответами
+        self._upsert(
+            chat_id, last_answers_code=answers_code, tips_segment=tip_segment_of_code(answers_code)
+        )
+
+    def get_last_answers(self, chat_id: int) -> Optional[int]:
+        cur = self.conn.cursor()
+        row = cur.execute(
+            "SELECT last_answers_code, last_answers FROM users WHERE chat_id=?;", (chat_id,)
+        ).fetchone()
+        if not row:
+            return None
+        if row["last_answers_code"] is not None:
+            return int(row["last_answers_code"])
+        # Запись в старом JSON-формате
+        return answers_code_from_json(row["last_answers"])
+
+    # ---------- FSM ----------
+    def load_fsm(self, key: str) -> Optional[Tuple[Optional[str], str, float]]:
         cur = self.conn.cursor()
         row = cur.execute(
-            "SELECT last_answers FROM users WHERE chat_id=?;", (chat_id,)
+            "SELECT state, data, updated_at FROM fsm_states WHERE key=?;", (key,)
         ).fetchone()
-        return row["last_answers"] if row else None
+        return (row["state"], row["data"], float(row["updated_at"])) if row else None
+
+    def save_fsm(self, rows: List[Tuple[str, Optional[str], Optional[str], float]]) -> None:
+        """rows: (key, state, data_json, updated_at); data_json=None — удалить запись."""
+        cur = self.conn.cursor()
+        with self.conn:
+            cur.executemany(
+                "INSERT INTO fsm_states(key, state, data, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state=excluded.state, data=excluded.data, "
+                "updated_at=excluded.updated_at;",
+                [row for row in rows if row[2] is not None],
+            )
+            cur.executemany(
+                "DELETE FROM fsm_states WHERE key=?;",
+                [(row[0],) for row in rows if row[2] is None],
+            )
+
+    def purge_fsm(self, before: float) -> int:
+        cur = self.conn.cursor()
+        with self.conn:
+            cur.execute("DELETE FROM fsm_states WHERE updated_at < ?;", (before,))
+        return cur.rowcount
+
+    # ---------- Channel members ----------
+    def get_channel_member(self, user_id: int) -> Optional[bool]:
+        """True/False — подписан ли пользователь по локальной таблице, None — ещё не видели."""
+        cur = self.conn.cursor()
+        row = cur.execute(
+            "SELECT is_member FROM channel_members WHERE user_id=?;", (user_id,)
+        ).fetchone()
+        return bool(row["is_member"]) if row else None
+
+    def set_channel_members(self, rows: List[Tuple[int, bool, float]]) -> None:
+        """rows: (user_id, is_member, checked_at)."""
+        cur = self.conn.cursor()
+        with self.conn:
+            cur.executemany(
+                "INSERT INTO channel_members(user_id, is_member, checked_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET is_member=excluded.is_member, "
+                "checked_at=excluded.checked_at;",
+                [(user_id, 1 if is_member else 0, checked_at) for user_id, is_member, checked_at in rows],
+            )
+
+    def get_stale_channel_members(self, before: float, limit: int) -> List[int]:
+        """Пользователи, которых давно не сверяли с API (самые старые первыми)."""
+        cur = self.conn.cursor()
+        rows = cur.execute(
+            "SELECT user_id FROM channel_members WHERE checked_at < ? ORDER BY checked_at LIMIT ?;",
+            (before, limit),
+        ).fetchall()
+        return [int(r["user_id"]) for r in rows]
+
+    # ---------- Group commit ----------
+    def apply_batch(self, batch: Dict[int, Dict[str, Any]]) -> None:
+        """Применяет накопленные изменения (chat_id -> {колонка: значение}) одной транзакцией."""
+        cur = self.conn.cursor()
+        with self.conn:
+            cur.executemany(
+                "INSERT OR IGNORE INTO users(chat_id) VALUES (?);",
+                [(chat_id,) for chat_id in batch],
+            )
+            for chat_id, cols in batch.items():
+                if not cols:
+                    continue
+                unknown = set(cols) - set(USER_COLUMNS)
+                if unknown:
+                    raise ValueError(f"Unknown users columns: {sorted(unknown)}")
+                assignments = ", ".join(f"{name}=?" for name in cols)
+                cur.execute(
+                    f"UPDATE users SET {assignments} WHERE chat_id=?;",
+                    (*cols.values(), chat_id),
+                )
 
     def close(self) -> None:
         self.conn.close()
+
+
+def _timed(fn, args):
+    # Выполняется в потоке БД: меряем сам запрос/commit, без ожидания в очереди
+    with DB_SECONDS.time(fn.__name__):
+        return fn(*args)
+
+
+class AsyncDB:
+    """
+    Асинхронный фасад над DB.
+    Все обращения к sqlite3 (включая commit/fsync) выполняются в отдельном потоке-писателе,
+    поэтому медленный диск не блокирует event loop и обработку апдейтов.
+
+    Режимы durability:
+    - immediate — каждая запись сразу коммитится (как раньше);
+    - batched   — write-behind: изменения копятся по chat_id и сбрасываются одной транзакцией
+                  раз в flush_interval секунд или при flush_max_ops операций;
+    - off       — как batched, но с PRAGMA synchronous=OFF (без fsync).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        profile: Optional[DBProfile] = None,
+        durability: str = "batched",
+        flush_interval: float = 0.05,
+        flush_max_ops: int = 500,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.path = path
+        self.profile = profile
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.flush_max_ops = flush_max_ops
+        # Один поток: соединение sqlite3 живёт в нём, запросы идут строго по очереди
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._db: Optional[DB] = None
+        self.known = KnownUsers()
+
+        # Отложенные изменения: chat_id -> {колонка: значение}
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._pending_ops = 0
+        self._wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def batched(self) -> bool:
+        return self.durability != "immediate"
+
+    @property
+    def pending(self) -> int:
+        """Сколько пользователей с отложенными (ещё не записанными) изменениями."""
+        return len(self._pending)
+
+    async def _call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        if DB_SECONDS.registry.enabled:
+            return await loop.run_in_executor(self._executor, _timed, fn, args)
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def init(self) -> None:
+        # Соединение создаём прямо в потоке-писателе
+        self._db = await self._call(DB, self.path)
+        synchronous = "OFF" if self.durability == "off" else None
+        await self._call(self._db.init, self.profile, synchronous)
+        self.known = KnownUsers(await self._call(self._db.get_all_chat_ids))
+        if self.batched:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    # ---------- Write-behind ----------
+    def _queue(self, chat_id: int, **cols: Any) -> None:
+        self.known.add(chat_id)
+        self._pending.setdefault(chat_id, {}).update(cols)
+        self._pending_ops += 1
+        if self._pending_ops >= self.flush_max_ops:
+            self._wakeup.set()
+
+    def _pending_value(self, chat_id: int, name: str) -> Tuple[bool, Any]:
+        cols = self._pending.get(chat_id)
+        if cols and name in cols:
+            return True, cols[name]
+        return False, None
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._pending_ops = 0
+        try:
+            await self._call(self._db.apply_batch, batch)
+        except BaseException:
+            # Возвращаем изменения в очередь (более новые значения важнее)
+            for chat_id, cols in batch.items():
+                merged = dict(cols)
+                merged.update(self._pending.get(chat_id, {}))
+                self._pending[chat_id] = merged
+            raise
+
+    async def _flush_loop(self) -> None:
+        # Выходим по флагу, а не только по cancel(): до Python 3.12 wait_for может
+        # «проглотить» отмену, если событие сработало в тот же момент
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("DB flush failed, will retry")
+
+    async def ensure_user(self, chat_id: int) -> None:
+        # Известный пользователь — никакой записи в БД
+        if chat_id in self.known:
+            return
+        if self.batched:
+            self._queue(chat_id)
+            return
+        await self._call(self._db.ensure_user, chat_id)
+        self.known.add(chat_id)
+
+    # ---------- Tips ----------
+    async def set_tips(self, chat_id: int, enabled: bool) -> None:
+        if self.batched:
+            if enabled:
+                self._queue(chat_id, tips_enabled=1, next_tip_at=None)
+            else:
+                self._queue(chat_id, tips_enabled=0)
+            return
+        await self._call(self._db.set_tips, chat_id, enabled)
+        self.known.add(chat_id)
+
+    async def get_tips_enabled(self, chat_id: int) -> bool:
+        found, value = self._pending_value(chat_id, "tips_enabled")
+        if found:
+            return bool(value)
+        return await self._call(self._db.get_tips_enabled, chat_id)
+
+    async def get_all_tips_enabled_users(self) -> List[Tuple[int, int]]:
+        await self.flush()
+        return await self._call(self._db.get_all_tips_enabled_users)
+
+    async def advance_tip_index(self, chat_id: int, new_index: int) -> None:
+        if self.batched:
+            self._queue(chat_id, tips_index=new_index)
+            return
+        await self._call(self._db.advance_tip_index, chat_id, new_index)
+
+    async def set_tips_time(self, chat_id: int, tz: Optional[str], minute: Optional[int]) -> None:
+        if self.batched:
+            self._queue(chat_id, tips_tz=tz, tips_minute=minute, next_tip_at=None)
+            return
+        await self._call(self._db.set_tips_time, chat_id, tz, minute)
+        self.known.add(chat_id)
+
+    async def get_tips_time(self, chat_id: int) -> Tuple[Optional[str], Optional[int]]:
+        found, tz = self._pending_value(chat_id, "tips_tz")
+        if found:
+            return tz, self._pending[chat_id]["tips_minute"]
+        return await self._call(self._db.get_tips_time, chat_id)
+
+    async def schedule_tips(self, now_minute: int, reschedule: Reschedule, limit: int = 5000) -> int:
+        await self.flush()
+        return await self._call(self._db.schedule_tips, now_minute, reschedule, limit)
+
+    async def claim_due_tips(
+        self, name: str, now_minute: int, reschedule: Reschedule, limit: int = 5000
+    ) -> Optional[int]:
+        # Включения/отключения советов и смена времени должны попасть в выборку
+        await self.flush()
+        job_id = await self._call(self._db.start_tips_job, name, now_minute)
+        if job_id is None:
+            return None
+        # Порциями, каждая — отдельный вызов: поток-писатель между ними свободен для хендлеров
+        after: Optional[int] = None
+        while True:
+            after = await self._call(
+                self._db.claim_tips_chunk, job_id, now_minute, reschedule, after, limit
+            )
+            if after is None:
+                return job_id
+
+    # ---------- Broadcast jobs ----------
+    async def get_unfinished_broadcast_jobs(self) -> List[int]:
+        return await self._call(self._db.get_unfinished_broadcast_jobs)
+
+    async def get_broadcast_chunk(
+        self, job_id: int, after_chat_id: Optional[int], limit: int
+    ) -> List[Tuple[int, int, Optional[int]]]:
+        await self.flush()
+        return await self._call(self._db.get_broadcast_chunk, job_id, after_chat_id, limit)
+
+    async def mark_broadcast_results(
+        self, job_id: int, results: List[Tuple[int, int, Optional[int]]]
+    ) -> None:
+        if results:
+            # Сначала отложенные изменения этих же пользователей: иначе более старое значение
+            # из очереди записалось бы поверх результата рассылки
+            await self.flush()
+            await self._call(self._db.mark_broadcast_results, job_id, results)
+
+    async def finish_broadcast_job(self, job_id: int) -> None:
+        await self._call(self._db.finish_broadcast_job, job_id)
+
+    # ---------- Save result text ----------
+    async def save_last_result(self, chat_id: int, text: str) -> None:
+        if self.batched:
+            self._queue(chat_id, last_result=text, saved_answers_code=None)
+            return
+        await self._call(self._db.save_last_result, chat_id, text)
+        self.known.add(chat_id)
+
+    async def get_last_result(self, chat_id: int) -> Optional[str]:
+        found, value = self._pending_value(chat_id, "last_result")
+        if found:
+            return value
+        return await self._call(self._db.get_last_result, chat_id)
+
+    # ---------- Saved plan (by reference) ----------
+    async def save_plan(self, chat_id: int, answers_code: int, level: int, version: int) -> None:
+        if self.batched:
+            self._queue(
+                chat_id,
+                saved_answers_code=answers_code,
+                saved_level=level,
+                saved_version=version,
+                last_result=None,
+            )
+            return
+        await self._call(self._db.save_plan, chat_id, answers_code, level, version)
+        self.known.add(chat_id)
+
+    async def get_saved_plan(self, chat_id: int) -> Optional[SavedPlan]:
+        found, code = self._pending_value(chat_id, "saved_answers_code")
+        if found:
+            cols = self._pending[chat_id]
+            if code is None:
+                return SavedPlan(None, None, None, cols.get("last_result"))
+            return SavedPlan(code, cols["saved_level"], cols["saved_version"], None)
+        return await self._call(self._db.get_saved_plan, chat_id)
+
+    # ---------- Save last answers payload (for "Подробнее") ----------
+    async def save_last_answers(self, chat_id: int, answers_code: int) -> None:
+        if self.batched:
+            self._queue(
+                chat_id, last_answers_code=answers_code, tips_segment=tip_segment_of_code(answers_code)
+            )
+            return
+        await self._call(self._db.save_last_answers, chat_id, answers_code)
+        self.known.add(chat_id)
+
+    async def get_last_answers(self, chat_id: int) -> Optional[int]:
+        found, value = self._pending_value(chat_id, "last_answers_code")
+        if found:
+            return value
+        return await self._call(self._db.get_last_answers, chat_id)
+
+    # ---------- Channel members ----------
+    async def get_channel_member(self, user_id: int) -> Optional[bool]:
+        return await self._call(self._db.get_channel_member, user_id)
+
+    async def set_channel_members(self, rows: List[Tuple[int, bool, float]]) -> None:
+        if rows:
+            await self._call(self._db.set_channel_members, rows)
+
+    async def get_stale_channel_members(self, before: float, limit: int) -> List[int]:
+        return await self._call(self._db.get_stale_channel_members, before, limit)
+
+    # ---------- FSM ----------
+    async def load_fsm(self, key: str) -> Optional[Tuple[Optional[str], str, float]]:
+        return await self._call(self._db.load_fsm, key)
+
+    async def save_fsm(self, rows: List[Tuple[str, Optional[str], Optional[str], float]]) -> None:
+        if rows:
+            await self._call(self._db.save_fsm, rows)
+
+    async def purge_fsm(self, before: float) -> int:
+        return await self._call(self._db.purge_fsm, before)
+
+    async def close(self) -> None:
+        # Гарантированный сброс отложенных записей перед закрытием
+        self._closing = True
+        if self._flusher is not None:
+            self._wakeup.set()
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._db is not None:
+            await self.flush()
+            await self._call(self._db.close)
+            self._db = None
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from .db import AsyncDB
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = 0.0
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище в общей SQLite-базе бота.
+    - LRU в памяти (не больше max_size записей), все чтения/записи идут через него;
+    - изменённые записи копятся в буфере и пишутся в БД пачкой раз в flush_interval;
+    - брошенные квизы старше ttl считаются пустыми и периодически удаляются из БД.
+    Прогресс квиза переживает рестарт бота.
+    """
+
+    def __init__(
+        self,
+        db: AsyncDB,
+        max_size: int = 10_000,
+        ttl: float = 86400.0,
+        flush_interval: float = 1.0,
+        purge_interval: float = 3600.0,
+    ):
+        self.db = db
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.purge_interval = purge_interval
+
+        self._cache: "OrderedDict[str, _Record]" = OrderedDict()
+        # Ещё не записанные в БД изменения: key -> запись
+        self._dirty: Dict[str, _Record] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(
+            str(part) if part is not None else ""
+            for part in (
+                key.bot_id,
+                key.chat_id,
+                key.user_id,
+                key.thread_id,
+                key.business_connection_id,
+                key.destiny,
+            )
+        )
+
+    def _remember(self, key: str, record: _Record) -> None:
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            # Вытеснять можно смело: несохранённые изменения лежат в _dirty
+            self._cache.popitem(last=False)
+
+    async def _get(self, key: str) -> _Record:
+        record = self._cache.get(key) or self._dirty.get(key)
+        if record is None:
+            row = await self.db.load_fsm(key)
+            if row is not None:
+                state, data, updated_at = row
+                record = _Record(state, json.loads(data), updated_at)
+            else:
+                record = _Record()
+        if not record.empty and record.updated_at < time.time() - self.ttl:
+            record = _Record()
+        self._remember(key, record)
+        return record
+
+    def _put(self, key: str, record: _Record) -> None:
+        record.updated_at = time.time()
+        self._remember(key, record)
+        self._dirty[key] = record
+        self._ensure_flusher()
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.time() - self._last_purge > self.purge_interval:
+                    self._last_purge = time.time()
+                    await self.db.purge_fsm(time.time() - self.ttl)
+            except Exception:
+                logger.exception("FSM flush failed, will retry")
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        rows = [
+            (
+                key,
+                record.state,
+                None if record.empty else json.dumps(record.data, ensure_ascii=False),
+                record.updated_at,
+            )
+            for key, record in dirty.items()
+        ]
+        try:
+            await self.db.save_fsm(rows)
+        except BaseException:
+            for key, record in dirty.items():
+                self._dirty.setdefault(key, record)
+            raise
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = self._key(key)
+        record = await self._get(k)
+        state = state.state if isinstance(state, State) else state
+        self._put(k, _Record(state, record.data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get(self._key(key))).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        k = self._key(key)
+        record = await self._get(k)
+        self._put(k, _Record(record.state, data.copy()))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get(self._key(key))).data.copy()
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+
+class NullStorage(BaseStorage):
+    """
+    Хранилище для QUIZ_MODE=stateless: прогресс квиза живёт в callback_data, состояние
+    не нужно. Диспетчер всё равно спрашивает его на каждом апдейте — отвечаем «пусто»
+    без обращения к БД и без записей в памяти.
+    """
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        pass
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        pass
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return {}
+
+    async def close(self) -> None:
+        pass
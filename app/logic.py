@@ -1,7 +1,7 @@
 from dataclasses import dataclass
-from typing import Literal
+from typing import Literal, Optional, Tuple, get_args
 
-from .content import image_links_for_set
+from .content import CONTENT_PATH, DEFAULT_PHOTO_SET, ContentBundle, load_bundle
 
 # ===== Types =====
 Skin = Literal["dry", "normal", "combo", "oily", "unknown"]
@@ -21,238 +21,195 @@ class Answers:
     occasion: Occasion
 
 
-# ===== Photo sets =====
-def pick_photo_set(a: Answers) -> int:
-    # Priority: occasion → eyes → undertone → skin → base
-    if a.occasion == "date":
-        return 2
-    if a.occasion == "party":
-        return 3
-    if a.occasion == "photo":
-        return 4
+# Версия формата сохранённых планов (ключ ответов + уровень).
+# Увеличить, если меняется упаковка ответов: старые ссылки станут недействительны.
+CONTENT_VERSION = 1
+
+
+# ===== Packed answers =====
+# Все ответы упаковываются в одно число (смешанная система счисления по вариантам),
+# это ключ для таблицы готовых текстов.
+SKIN_OPTIONS: Tuple[str, ...] = get_args(Skin)
+TONE_OPTIONS: Tuple[str, ...] = get_args(Tone)
+UNDERTONE_OPTIONS: Tuple[str, ...] = get_args(Undertone)
+EYES_OPTIONS: Tuple[str, ...] = get_args(Eyes)
+OCCASION_OPTIONS: Tuple[str, ...] = get_args(Occasion)
+LEVEL_OPTIONS: Tuple[str, ...] = get_args(DetailLevel)
+
+_ANSWER_FIELDS = (
+    ("skin", SKIN_OPTIONS),
+    ("tone", TONE_OPTIONS),
+    ("undertone", UNDERTONE_OPTIONS),
+    ("eyes", EYES_OPTIONS),
+    ("occasion", OCCASION_OPTIONS),
+)
+_ANSWER_INDEX = {name: {v: i for i, v in enumerate(opts)} for name, opts in _ANSWER_FIELDS}
+
+ANSWERS_SPACE = 1
+for _, _opts in _ANSWER_FIELDS:
+    ANSWERS_SPACE *= len(_opts)
+
+
+def encode_answers(a: Answers) -> int:
+    """Answers -> число в диапазоне [0, ANSWERS_SPACE). ValueError для неизвестных вариантов."""
+    code = 0
+    for name, opts in _ANSWER_FIELDS:
+        try:
+            idx = _ANSWER_INDEX[name][getattr(a, name)]
+        except KeyError:
+            raise ValueError(f"Unknown {name}: {getattr(a, name)!r}") from None
+        code = code * len(opts) + idx
+    return code
+
+
+# Посимвольная запись ответов (одна цифра на поле) — для callback_data в stateless-квизе
+def answer_digit(name: str, value: str) -> str:
+    return str(_ANSWER_INDEX[name][value])
+
+
+def answer_digits_valid(digits: str) -> bool:
+    return len(digits) <= len(_ANSWER_FIELDS) and all(
+        ch.isdigit() and int(ch) < len(opts) for ch, (_, opts) in zip(digits, _ANSWER_FIELDS)
+    )
+
+
+def answers_from_digits(digits: str) -> Answers:
+    if len(digits) != len(_ANSWER_FIELDS) or not answer_digits_valid(digits):
+        raise ValueError(f"Invalid answers digits: {digits!r}")
+    return Answers(*(opts[int(ch)] for ch, (_, opts) in zip(digits, _ANSWER_FIELDS)))
+
+
+def decode_answers(code: int) -> Answers:
+    if not 0 <= code < ANSWERS_SPACE:
+        raise ValueError(f"Answers code out of range: {code}")
+    values = {}
+    for name, opts in reversed(_ANSWER_FIELDS):
+        code, idx = divmod(code, len(opts))
+        values[name] = opts[idx]
+    return Answers(**values)
+
+
+# ===== Tip segments =====
+# Ежедневные советы подбираются по коже, подтону, глазам и поводу (тон на них не влияет).
+# Сегмент — такие же упакованные ответы, но только по этим полям.
+TIP_SEGMENT_FIELDS = tuple(
+    (name, opts) for name, opts in _ANSWER_FIELDS if name in ("skin", "undertone", "eyes", "occasion")
+)
+
+TIP_SEGMENTS = 1
+for _, _opts in TIP_SEGMENT_FIELDS:
+    TIP_SEGMENTS *= len(_opts)
+
+
+def tip_segment(a: Answers) -> int:
+    segment = 0
+    for name, opts in TIP_SEGMENT_FIELDS:
+        segment = segment * len(opts) + _ANSWER_INDEX[name][getattr(a, name)]
+    return segment
+
+
+def segment_values(segment: int) -> dict:
+    """Сегмент -> {поле: вариант} по TIP_SEGMENT_FIELDS."""
+    values = {}
+    for name, opts in reversed(TIP_SEGMENT_FIELDS):
+        segment, idx = divmod(segment, len(opts))
+        values[name] = opts[idx]
+    return values
+
+
+# Код ответов -> сегмент, посчитано заранее для всех ANSWERS_SPACE кодов
+_SEGMENT_BY_CODE: Tuple[int, ...] = tuple(tip_segment(decode_answers(c)) for c in range(ANSWERS_SPACE))
+
+
+def tip_segment_of_code(code: int) -> int:
+    return _SEGMENT_BY_CODE[code]
+
+
+# ===== Content bundle =====
+# Тексты, наборы фото и правила выбора — из content.json (см. content.py, rules.py).
+# Текущий бандл подменяется целиком одним присваиванием, поэтому обработчик всегда видит
+# либо старый, либо новый контент; кэши ниже привязаны к версии бандла.
+_BUNDLE: ContentBundle = load_bundle(_ANSWER_FIELDS)
 
-    if a.eyes == "hooded":
-        return 5
-    if a.eyes == "small":
-        return 6
 
-    if a.undertone == "warm":
-        return 7
-    if a.undertone == "cool":
-        return 8
+def content_bundle() -> ContentBundle:
+    return _BUNDLE
 
-    if a.skin in ("oily", "combo"):
-        return 9
-    if a.skin == "dry":
-        return 10
 
-    return 1
+def set_content(bundle: ContentBundle) -> None:
+    global _BUNDLE
+    _BUNDLE = bundle
+
+
+def reload_content(path: str = CONTENT_PATH, require_newer: bool = True) -> ContentBundle:
+    """
+    Загружает бандл и делает его текущим. При перезагрузке версия должна расти —
+    по ней сбрасываются кэши. ValueError / OSError — текущий бандл остаётся как был.
+    """
+    bundle = load_bundle(_ANSWER_FIELDS, path)
+    if require_newer and bundle.version <= _BUNDLE.version:
+        raise ValueError(f"Content version must grow: {bundle.version} <= {_BUNDLE.version}")
+    set_content(bundle)
+    return bundle
+
+
+def image_links_for_set(set_id: int) -> str:
+    links = _BUNDLE.photo_links
+    return links.get(set_id) or links[DEFAULT_PHOTO_SET]
+
+
+# ===== Photo sets =====
+def pick_photo_set(a: Answers) -> int:
+    return _BUNDLE.rules.photo_set.get(vars(a))
 
 
 # ===== Summary lines =====
 def skin_line(s: Skin) -> str:
-    return {
-        "dry": "сухая → увлажнение и кремовые текстуры (сияние выглядит лучше)",
-        "normal": "нормальная → подойдут почти все текстуры, лучше лёгкие слои",
-        "combo": "комбинированная → матируем Т-зону, щёки оставляем “живыми”",
-        "oily": "жирная → тонкий слой + фиксация в Т-зоне, без “маски”",
-        "unknown": "тип не определён → универсально: лёгкий тон + точечная коррекция",
-    }[s]
+    return _BUNDLE.rules.skin_line.get({"skin": s})
 
 
 def undertone_line(u: Undertone) -> str:
-    return {
-        "warm": "тёплый → персиковые, бежевые, золотистые оттенки",
-        "cool": "холодный → розовые, ягодные, холодные бежи",
-        "unknown": "не определён → нейтральные бежево-розовые оттенки",
-    }[u]
+    return _BUNDLE.rules.undertone_line.get({"undertone": u})
 
 
 def palette_hint(u: Undertone) -> str:
-    return {
-        "warm": "🎨 Оттенки: персик, тёплый беж, карамель, тёплый коричневый.",
-        "cool": "🎨 Оттенки: розово-бежевый, тауп, серо-коричневый, ягодный нюд.",
-        "unknown": "🎨 Оттенки: бежево-розовый, светлый тауп, нейтральный коричневый.",
-    }[u]
+    return _BUNDLE.rules.palette_hint.get({"undertone": u})
 
 
 def eyes_short(e: Eyes) -> str:
-    return {
-        "small": "маленькие → свет внутри, тень только снаружи (растушёвка вверх)",
-        "big": "большие → добавляем глубину мягкой тенью, без тяжёлого низа",
-        "hooded": "навиcшее веко → тени выше складки, мягкие линии, матовые текстуры",
-        "almond": "миндалевидные → универсально: тень во внешний угол + диагональ к виску",
-    }[e]
+    return _BUNDLE.rules.eyes_short.get({"eyes": e})
 
 
 # ===== Detailed eyes guides =====
 def eyes_full(e: Eyes) -> str:
-    if e == "small":
-        return (
-            "## 👁 Маленькие глаза — как визуально увеличить\n\n"
-            "🎯 **Задача макияжа:** сделать глаз шире и “открыть” взгляд, не утяжеляя веко.\n\n"
-            "🗺 **Карта зон:**\n"
-            "• **Свет** — подвижное веко + внутренний угол\n"
-            "• **Полутень** — центр века\n"
-            "• **Тень** — только внешний угол\n\n"
-            "✏️ **Форма растушёвки:**\n"
-            "• начинай от внешнего уголка\n"
-            "• веди кисть **по диагонали вверх** к хвостику брови\n"
-            "• форма напоминает **V / галочку**\n"
-            "• тень **не опускай вниз**\n\n"
-            "👁 **Нижнее веко:**\n"
-            "• тень только во **внешней трети**\n"
-            "• центр и внутренний угол оставляй светлыми\n\n"
-            "🖌 **Подводка:**\n"
-            "• лучше тени/карандаш, а не чёрная стрелка\n"
-            "• линия тонкая по верхним ресницам\n"
-            "• хвостик — короткий и направлен вверх\n\n"
-            "🖤 **Тушь:**\n"
-            "• 1 слой — на все ресницы\n"
-            "• 2 слой — **только во внешнем уголке**\n"
-            "• подкручивание очень помогает\n\n"
-            "✅ **Быстрый чек:** если **центр века светлый** — глаз уже выглядит больше.\n\n"
-            "❌ **Ошибка новичка:** тёмные тени по всему веку и активный низ → глаз “сжимается”."
-        )
-
-    if e == "hooded":
-        return (
-            "## 👁 Нависшее веко — лифтинг без стрелок\n\n"
-            "🎯 **Задача макияжа:** приподнять форму глаза и сделать макияж видимым при открытом взгляде.\n\n"
-            "🗺 **Карта зон:**\n"
-            "• **Свет** — подвижное веко\n"
-            "• **Тень** — **выше** естественной складки\n"
-            "• **Внутренний угол** — маленькая точка света\n\n"
-            "✏️ **Форма растушёвки:**\n"
-            "• тень ставь **на открытом глазе** (смотри прямо)\n"
-            "• растушёвывай **вверх и наружу**\n"
-            "• форма — мягкое “крыло” (лифтинг)\n\n"
-            "🖌 **Подводка:**\n"
-            "• избегай толстых стрелок\n"
-            "• лучше **межресничка** + маленький хвостик тенями\n"
-            "• хвостик направляй вверх\n\n"
-            "👁 **Нижнее веко:**\n"
-            "• минимум: либо не трогай, либо очень мягко во внешнем углу\n\n"
-            "🖤 **Тушь:**\n"
-            "• подкручивание обязательно\n"
-            "• акцент на внешние ресницы\n\n"
-            "✅ **Быстрый чек:** тень должна быть **видна при открытом глазе**.\n\n"
-            "❌ **Ошибка новичка:** рисовать тень точно по складке — она “прячется”."
-        )
-
-    if e == "big":
-        return (
-            "## 👁 Большие глаза — глубина и баланс\n\n"
-            "🎯 **Задача макияжа:** добавить глубину и сделать образ собранным.\n\n"
-            "🗺 **Карта зон:**\n"
-            "• **Свет** — подвижное веко (не белый, а светло-бежевый)\n"
-            "• **Тень** — внешний угол\n"
-            "• **Полутень** — мягко по складке, чтобы добавить глубину\n\n"
-            "✏️ **Форма растушёвки:**\n"
-            "• растушёвка по диагонали к виску\n"
-            "• без резких границ\n\n"
-            "🖌 **Подводка:**\n"
-            "• можно тонкую линию по верхним ресницам\n"
-            "• без сильного утолщения к центру\n\n"
-            "👁 **Нижнее веко:**\n"
-            "• не затемняй по всей длине\n"
-            "• максимум — внешняя треть\n\n"
-            "🖤 **Тушь:**\n"
-            "• 1–2 слоя, без “паучьих лапок”\n\n"
-            "✅ **Быстрый чек:** если низ глаза лёгкий — макияж выглядит дороже.\n\n"
-            "❌ **Ошибка новичка:** одновременно тёмный верх + тёмный низ (утяжеляет взгляд)."
-        )
-
-    # almond
-    return (
-        "## 👁 Миндалевидные глаза — подчеркнуть форму\n\n"
-        "🎯 **Задача макияжа:** аккуратно подчеркнуть естественную форму.\n\n"
-        "🗺 **Карта зон:**\n"
-        "• **Свет** — подвижное веко\n"
-        "• **Тень** — внешний угол\n"
-        "• **Внутренний угол** — чуть-чуть света, без перебора\n\n"
-        "✏️ **Форма растушёвки:**\n"
-        "• классическая диагональ в сторону виска\n"
-        "• мягко, без чётких границ\n\n"
-        "🖌 **Подводка:**\n"
-        "• идеально — мягкая стрелка тенями\n"
-        "• хвостик повторяет направление нижнего века\n\n"
-        "👁 **Нижнее веко:**\n"
-        "• лёгкая тень во внешней трети\n\n"
-        "🖤 **Тушь:**\n"
-        "• акцент на внешние ресницы\n\n"
-        "✅ **Быстрый чек:** если форма “тянется” к виску — это тот самый эффект.\n\n"
-        "❌ **Ошибка новичка:** делать слишком много акцентов сразу."
-    )
+    return _BUNDLE.rules.eyes_full.get({"eyes": e})
 
 
 # ===== Face steps (detailed) =====
 def face_steps(a: Answers) -> str:
     # конкретные инструкции по зонам лица
-    prep = "1️⃣ **Подготовка:** крем/гель. Подожди 2–3 минуты."
-    if a.skin == "oily":
-        prep = "1️⃣ **Подготовка:** лёгкий гель/крем. Подожди 2–3 минуты."
-
-    tone = "2️⃣ **Тон:** тонкий слой. Если нужно — лучше второй тонкий, чем один плотный."
-    concealer = "3️⃣ **Консилер:** точечно (покраснения/прыщики). Под глаза — тонко, только где темнота."
-    powder = "4️⃣ **Пудра:** только там, где блестит (обычно Т-зона)."
-    if a.skin == "dry":
-        powder = "4️⃣ **Пудра:** минимум (при желании — только Т-зона)."
-
-    blush = "5️⃣ **Румяна:** выше “яблочек” → к вискам (лифтинг)."
-    highlight = "6️⃣ **Высветлить (по желанию):** верх скулы, внутренний уголок глаза (чуть-чуть)."
-    contour = "7️⃣ **Затемнить (по желанию):** мягко под скулу и по линии роста волос (не в центр лица)."
-
-    extra = ""
-    if a.occasion == "date":
-        extra = "✨ Для свидания: оставь кожу живой, сделай мягкий румянец и нежные губы."
-    elif a.occasion == "party":
-        extra = "✨ Для праздника: можно добавить выразительность глазам, но без тяжёлого низа."
-    elif a.occasion == "photo":
-        extra = "✨ Для фото/видео: меньше сильного блеска, больше аккуратных матовых/сатиновых текстур."
-
-    return "\n".join([prep, tone, concealer, powder, blush, highlight, contour]) + ("\n\n" + extra if extra else "")
+    values = vars(a)
+    extra = _BUNDLE.rules.face_extra.get(values)
+    return "\n".join(step.get(values) for step in _BUNDLE.rules.face_steps) + ("\n\n" + extra if extra else "")
 
 
 # ===== Lips =====
 def lips_line(a: Answers) -> str:
-    if a.occasion == "party":
-        return "👄 **Губы:** нюд или чуть ярче (если глаза спокойные)."
-    if a.occasion == "date":
-        return "👄 **Губы:** мягкий нюд/блеск (женственно и свежо)."
-    if a.occasion == "photo":
-        return "👄 **Губы:** нюд без сильного глянца (чтобы не бликовало)."
-    return "👄 **Губы:** нюд/блеск по подтону."
+    return _BUNDLE.rules.lips_line.get(vars(a))
 
 
 # ===== Mistakes =====
 def main_mistake(a: Answers) -> str:
-    if a.eyes == "hooded":
-        return "чёткая линия по складке и толстая стрелка — “съедают” веко"
-    if a.eyes == "small":
-        return "тёмные тени по всему веку и активный низ — уменьшают глаза"
-    if a.skin == "dry":
-        return "плотный матовый тон и много пудры — подчёркивают сухость"
-    if a.skin == "oily":
-        return "плотный тон толстым слоем — быстрее “поплывёт”"
-    if a.occasion == "photo":
-        return "крупный блеск/глиттер — часто выглядит неаккуратно в кадре"
-    return "перегружать лицо лишними слоями"
+    return _BUNDLE.rules.main_mistake.get(vars(a))
 
 
 # ===== Formula =====
 def formula_line(a: Answers) -> str:
-    if a.eyes == "small":
-        return "✨ **Формула:** свет внутри → тень снаружи → растушёвка вверх"
-    if a.eyes == "hooded":
-        return "✨ **Формула:** тень выше складки → мягкие линии → лифтинг вверх"
-    if a.eyes == "big":
-        return "✨ **Формула:** мягкая глубина → чистый низ → аккуратная тушь"
-    return "✨ **Формула:** свет на веко → тень во внешний угол → диагональ к виску"
+    return _BUNDLE.rules.formula_line.get(vars(a))
 
 
 # ===== Build text =====
-def build_text(a: Answers, level: DetailLevel = "short") -> str:
+def render_text(a: Answers, level: DetailLevel = "short") -> str:
     set_id = pick_photo_set(a)
     photo_links = image_links_for_set(set_id)
 
@@ -293,3 +250,36 @@ def build_text(a: Answers, level: DetailLevel = "short") -> str:
         + f"❌ **Частая ошибка:** {main_mistake(a)}\n"
         + formula_line(a)
     )
+
+
+# ===== Precomputed texts =====
+# Пространство ответов конечно (ANSWERS_SPACE × 2 уровня), поэтому все тексты
+# рендерятся один раз и дальше отдаются по индексу. Таблица помнит версию бандла,
+# из которого собрана: после перезагрузки контента она пересобирается.
+_TEXT_TABLE: Optional[Tuple[int, Tuple[str, ...]]] = None
+
+
+def build_text_table() -> Tuple[str, ...]:
+    global _TEXT_TABLE
+    version = _BUNDLE.version
+    if _TEXT_TABLE is None or _TEXT_TABLE[0] != version:
+        _TEXT_TABLE = (
+            version,
+            tuple(
+                render_text(decode_answers(code), level)
+                for code in range(ANSWERS_SPACE)
+                for level in LEVEL_OPTIONS
+            ),
+        )
+    return _TEXT_TABLE[1]
+
+
+def build_text(a: Answers, level: DetailLevel = "short") -> str:
+    try:
+        code = encode_answers(a)
+    except ValueError:
+        # Нестандартные ответы — рендерим как раньше
+        return render_text(a, level)
+    cached = _TEXT_TABLE
+    table = cached[1] if cached is not None and cached[0] == _BUNDLE.version else build_text_table()
+    return table[code * len(LEVEL_OPTIONS) + (0 if level == "short" else 1)]
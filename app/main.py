@@ -1,13 +1,17 @@
 import asyncio
-import json
+import logging
+import time
+from functools import lru_cache
+from typing import Optional
 from zoneinfo import ZoneInfo
 
 from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, ChatMemberUpdated
 from aiogram.filters import CommandStart, Command
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 
 from aiogram.dispatcher.middlewares.base import BaseMiddleware
@@ -15,11 +19,41 @@ from aiogram.dispatcher.event.bases import CancelHandler
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from .broadcast import run_broadcasts
+from .config import Settings, get_settings
+from .content import CONTENT_PATH
+from .contentwatch import ContentWatcher
+from .db import AsyncDB, DBProfile
+from .fsm import NullStorage, SQLiteStorage
+from .members import ChannelMembers, is_member
+from . import metrics
+from .metrics import SUBSCRIPTION_CHECKS, start_metrics_server
+from .outbound import create_session
+from .subcache import SubscriptionCache
+from .throttle import ThrottleMiddleware
+from .tipschedule import TipSchedule, format_minute, parse_tz_args
+from .shard import run_sharded
+from .webhook import run_webhook
+from .logic import (
+    ANSWERS_SPACE,
+    CONTENT_VERSION,
+    LEVEL_OPTIONS,
+    Answers,
+    answer_digit,
+    answer_digits_valid,
+    answers_from_digits,
+    build_text,
+    build_text_table,
+    content_bundle,
+    decode_answers,
+    encode_answers,
+    reload_content,
+)
+
 
-from .config import get_settings
-from .db import DB
-from .logic import Answers, build_text
-from .content import DAILY_TIPS
+logger = logging.getLogger(__name__)
 
 
 # ================== SUBSCRIPTION GATE ==================
@@ -27,18 +61,29 @@ CHANNEL_USERNAME = "@makeupsekrets"
 CHANNEL_URL = "https://t.me/makeupsekrets"
 
 
-async def is_subscribed(bot: Bot, user_id: int) -> bool:
+async def fetch_membership(bot: Bot, user_id: int) -> Optional[bool]:
     """
-    Проверка подписки на канал.
-    ВАЖНО: чтобы get_chat_member работал стабильно, добавь бота в канал как администратора.
+    Проверка подписки на канал через API; None — проверить не удалось.
+    ВАЖНО: добавь бота в канал как администратора — так работает get_chat_member
+    и приходят chat_member-апдейты, по которым ведётся локальная таблица подписчиков.
     """
     try:
         member = await bot.get_chat_member(CHANNEL_USERNAME, user_id)
-        return member.status in ("member", "administrator", "creator")
-    except Exception:
-        return False
+    except Exception as e:
+        # Не подписан «по ошибке»: считаем и пишем в лог, чтобы это было видно
+        SUBSCRIPTION_CHECKS.inc("error")
+        logger.warning("Subscription check for %s failed: %s", user_id, e)
+        return None
+    subscribed = is_member(member)
+    SUBSCRIPTION_CHECKS.inc("subscribed" if subscribed else "not_subscribed")
+    return subscribed
+
+
+def is_channel_event(event: ChatMemberUpdated) -> bool:
+    return (event.chat.username or "").lower() == CHANNEL_USERNAME.lstrip("@").lower()
 
 
+@lru_cache(maxsize=None)
 def kb_subscribe():
     kb = InlineKeyboardBuilder()
     kb.button(text="👉 Подписаться на канал", url=CHANNEL_URL)
@@ -59,11 +104,14 @@ class SubscriptionMiddleware(BaseMiddleware):
     """
     Автопроверка подписки на КАЖДОЕ сообщение/кнопку.
     Если пользователь не подписан — показываем экран подписки и стопаем дальнейшую обработку.
+    Результат берётся из SubscriptionCache (за ним — локальная таблица подписчиков),
+    чтобы не дёргать get_chat_member на каждое нажатие.
     """
 
-    async def __call__(self, handler, event, data):
-        bot: Bot = data["bot"]
+    def __init__(self, cache: SubscriptionCache):
+        self.cache = cache
 
+    async def __call__(self, handler, event, data):
         # Определяем user_id для Message или CallbackQuery
         user_id = None
         if isinstance(event, Message):
@@ -83,7 +131,7 @@ class SubscriptionMiddleware(BaseMiddleware):
             return await handler(event, data)
 
         # Проверяем подписку
-        if await is_subscribed(bot, user_id):
+        if await self.cache.check(user_id):
             return await handler(event, data)
 
         # Если не подписан — показываем сообщение и отменяем дальнейшие хендлеры
@@ -110,7 +158,10 @@ class Quiz(StatesGroup):
 
 
 # ================= KEYBOARDS =================
+# Клавиатуры не меняются, поэтому каждая собирается один раз (lru_cache),
+# дальше хендлеры получают один и тот же неизменяемый объект.
 
+@lru_cache(maxsize=None)
 def kb_start():
     kb = InlineKeyboardBuilder()
     kb.button(text="👉 Начать", callback_data="start_quiz")
@@ -118,65 +169,102 @@ def kb_start():
     return kb.as_markup()
 
 
-def kb_skin():
+# Шаги квиза: (поле Answers, префикс callback_data, вопрос, кнопки (текст, значение), раскладка)
+QUIZ_STEPS = (
+    (
+        "skin", "skin", "Какая у тебя кожа?",
+        (("Сухая", "dry"), ("Нормальная", "normal"), ("Комбинированная", "combo"),
+         ("Жирная", "oily"), ("Не знаю 🤍", "unknown")),
+        (2, 2, 1),
+    ),
+    (
+        "tone", "tone", "Какой у тебя тон кожи?",
+        (("Светлый", "light"), ("Средний", "medium"), ("Смуглый", "tan")),
+        (2, 1),
+    ),
+    (
+        "undertone", "undertone", "Подтон кожи:",
+        (("Тёплый", "warm"), ("Холодный", "cool"), ("Не знаю", "unknown")),
+        (2, 1),
+    ),
+    (
+        "eyes", "eyes", "Форма глаз:",
+        (("Маленькие", "small"), ("Большие", "big"), ("Нависшее веко", "hooded"),
+         ("Миндалевидные", "almond")),
+        (2, 2),
+    ),
+    (
+        "occasion", "occ", "Для какого случая макияж?",
+        (("Каждый день", "daily"), ("Свидание", "date"), ("Праздник", "party"),
+         ("Фото / видео", "photo")),
+        (2, 2),
+    ),
+)
+
+# Stateless-режим: callback_data = "qz:" + по одной цифре на каждый уже выбранный ответ
+STATELESS_PREFIX = "qz:"
+
+
+@lru_cache(maxsize=512)
+def _kb_quiz_step(step: int, digits: Optional[str] = None):
+    field, prefix, _, buttons, layout = QUIZ_STEPS[step]
     kb = InlineKeyboardBuilder()
-    kb.button(text="Сухая", callback_data="skin:dry")
-    kb.button(text="Нормальная", callback_data="skin:normal")
-    kb.button(text="Комбинированная", callback_data="skin:combo")
-    kb.button(text="Жирная", callback_data="skin:oily")
-    kb.button(text="Не знаю 🤍", callback_data="skin:unknown")
-    kb.adjust(2, 2, 1)
+    for text, value in buttons:
+        if digits is None:
+            callback_data = f"{prefix}:{value}"
+        else:
+            callback_data = STATELESS_PREFIX + digits + answer_digit(field, value)
+        kb.button(text=text, callback_data=callback_data)
+    kb.adjust(*layout)
     return kb.as_markup()
 
 
+@lru_cache(maxsize=None)
+def kb_skin():
+    return _kb_quiz_step(0)
+
+
+@lru_cache(maxsize=None)
 def kb_tone():
-    kb = InlineKeyboardBuilder()
-    kb.button(text="Светлый", callback_data="tone:light")
-    kb.button(text="Средний", callback_data="tone:medium")
-    kb.button(text="Смуглый", callback_data="tone:tan")
-    kb.adjust(2, 1)
-    return kb.as_markup()
+    return _kb_quiz_step(1)
 
 
+@lru_cache(maxsize=None)
 def kb_undertone():
-    kb = InlineKeyboardBuilder()
-    kb.button(text="Тёплый", callback_data="undertone:warm")
-    kb.button(text="Холодный", callback_data="undertone:cool")
-    kb.button(text="Не знаю", callback_data="undertone:unknown")
-    kb.adjust(2, 1)
-    return kb.as_markup()
+    return _kb_quiz_step(2)
 
 
+@lru_cache(maxsize=None)
 def kb_eyes():
-    kb = InlineKeyboardBuilder()
-    kb.button(text="Маленькие", callback_data="eyes:small")
-    kb.button(text="Большие", callback_data="eyes:big")
-    kb.button(text="Нависшее веко", callback_data="eyes:hooded")
-    kb.button(text="Миндалевидные", callback_data="eyes:almond")
-    kb.adjust(2, 2)
-    return kb.as_markup()
+    return _kb_quiz_step(3)
 
 
+@lru_cache(maxsize=None)
 def kb_occasion():
-    kb = InlineKeyboardBuilder()
-    kb.button(text="Каждый день", callback_data="occ:daily")
-    kb.button(text="Свидание", callback_data="occ:date")
-    kb.button(text="Праздник", callback_data="occ:party")
-    kb.button(text="Фото / видео", callback_data="occ:photo")
-    kb.adjust(2, 2)
-    return kb.as_markup()
+    return _kb_quiz_step(4)
+
+
+def kb_quiz_stateless(digits: str):
+    """Клавиатура следующего шага: в callback_data уже зашиты все предыдущие ответы."""
+    return _kb_quiz_step(len(digits), digits)
+
+
+# «Сохранить» несёт код ответов своего плана: сохраняется именно тот план, под которым кнопка
+SAVE_PREFIX = "save:"
 
 
-def kb_result():
+@lru_cache(maxsize=None)
+def kb_result(code: int):
     kb = InlineKeyboardBuilder()
     kb.button(text="📌 Подробнее", callback_data="detail")
-    kb.button(text="💾 Сохранить", callback_data="save")
+    kb.button(text="💾 Сохранить", callback_data=f"{SAVE_PREFIX}{code}")
     kb.button(text="💌 Получать советы", callback_data="tips_on")
     kb.button(text="🔁 Начать сначала", callback_data="restart")
     kb.adjust(1, 1, 1, 1)
     return kb.as_markup()
 
 
+@lru_cache(maxsize=None)
 def kb_tips_confirm():
     kb = InlineKeyboardBuilder()
     kb.button(text="Да, хочу ✨", callback_data="tips_yes")
@@ -185,57 +273,215 @@ def kb_tips_confirm():
     return kb.as_markup()
 
 
+def warm_keyboards():
+    for kb in (kb_subscribe, kb_start, kb_skin, kb_tone, kb_undertone, kb_eyes,
+               kb_occasion, kb_tips_confirm):
+        kb()
+    for code in range(ANSWERS_SPACE):
+        kb_result(code)
+    # Все клавиатуры stateless-квиза (их конечное число)
+    prefixes = [""]
+    for field, _, _, buttons, _ in QUIZ_STEPS[:-1]:
+        prefixes = [p + answer_digit(field, value) for p in prefixes for _, value in buttons]
+        for p in prefixes:
+            kb_quiz_stateless(p)
+
+
 # ================= DAILY TIPS =================
 
-async def send_daily_tips(bot: Bot, db: DB):
-    users = db.get_all_tips_enabled_users()
-    for chat_id, idx in users:
-        try:
-            tip = DAILY_TIPS[idx % len(DAILY_TIPS)]
-            await bot.send_message(chat_id, tip)
-            db.advance_tip_index(chat_id, (idx + 1) % len(DAILY_TIPS))
-        except Exception:
-            continue
+def outbound_rate(settings: Settings) -> float:
+    """
+    Доля общего лимита OUTBOUND_RATE на один процесс: при WORKERS=N у каждого воркера свой
+    bucket, и вместе они не должны превысить лимит Telegram на бота.
+    """
+    return settings.outbound_rate / max(settings.workers, 1)
 
 
-# ================= MAIN =================
+def broadcast_options(settings: Settings) -> dict:
+    # Рассылка идёт в одном процессе (воркер 0) и быстрее его доли общего лимита не пойдёт
+    return dict(
+        concurrency=settings.broadcast_concurrency,
+        rate=min(settings.broadcast_rate, outbound_rate(settings)),
+    )
+
+
+def tip_schedule(settings: Settings) -> TipSchedule:
+    return TipSchedule(
+        settings.tz,
+        base_minute=settings.daily_hour * 60 + settings.daily_minute,
+        window=settings.tips_window_minutes,
+    )
+
+
+SCHEDULE_BATCH = 5000
 
-async def main():
-    settings = get_settings()
 
+async def send_daily_tips(bot: Bot, db: AsyncDB, settings: Settings, now: Optional[float] = None):
+    """
+    Тик планировщика (раз в минуту). У каждого подписчика своё next_tip_at, поэтому за тик
+    из индекса берутся только те, чьё время подошло, — одно задание на минуту.
+    Пропущенные минуты (рестарт, долгая рассылка) подхватит следующий тик: next_tip_at <= now.
+    """
+    schedule = tip_schedule(settings)
+    now_minute = int((time.time() if now is None else now) // 60)
+    # Новые подписчики и сменившие время: рассчитываем им next_tip_at
+    while await db.schedule_tips(now_minute, schedule.next_at, SCHEDULE_BATCH) == SCHEDULE_BATCH:
+        pass
+    await db.claim_due_tips(f"tips:{now_minute}", now_minute, schedule.next_at, SCHEDULE_BATCH)
+    # Выполняет новое задание и дорабатывает прерванные
+    await run_broadcasts(bot, db, **broadcast_options(settings))
+
+
+async def resume_daily_tips(bot: Bot, db: AsyncDB, settings: Settings):
+    # После рестарта дорабатываем прерванные рассылки с последней контрольной точки
+    await run_broadcasts(bot, db, **broadcast_options(settings))
+
+
+# ================= MAIN =================
+
+async def create_bot(settings: Settings, run_scheduler: bool = True):
+    """
+    Собирает бота целиком, кроме приёма апдейтов: БД, FSM, диспетчер с хендлерами, планировщик.
+    run_scheduler=False — для воркеров, где рассылка советов не нужна.
+    """
+    # Свой бандл контента — до сборки таблиц (ошибка в нём не даст стартовать)
+    if settings.content_path != CONTENT_PATH:
+        reload_content(settings.content_path, require_newer=False)
+    # Все тексты результата и клавиатуры готовим заранее, чтобы первый пользователь не ждал
+    build_text_table()
+    warm_keyboards()
+
+    # Все исходящие запросы — через один пул соединений и общие лимиты (см. outbound.py)
+    session = create_session(
+        pool_size=settings.outbound_pool_size,
+        keepalive_timeout=settings.outbound_keepalive,
+        api_url=settings.bot_api_url,
+        rate=outbound_rate(settings),
+        chat_rate=settings.outbound_chat_rate,
+        chat_burst=settings.outbound_chat_burst,
+        max_retries=settings.outbound_max_retries,
+    )
     bot = Bot(
         token=settings.bot_token,
+        session=session,
         default=DefaultBotProperties(parse_mode="Markdown")
     )
 
-    dp = Dispatcher()
+    db = AsyncDB(
+        settings.db_path,
+        profile=DBProfile(
+            journal_mode=settings.db_journal_mode,
+            synchronous=settings.db_synchronous,
+            mmap_size=settings.db_mmap_size,
+            cache_size=settings.db_cache_size,
+            temp_store=settings.db_temp_store,
+            tips_index=settings.db_tips_index,
+        ),
+        durability=settings.db_durability,
+        flush_interval=settings.db_flush_interval_ms / 1000,
+        flush_max_ops=settings.db_flush_max_ops,
+    )
+    await db.init()
+
+    # FSM квиза: в SQLite (переживает рестарт) или в памяти; в stateless-режиме он не нужен
+    if settings.quiz_mode == "stateless":
+        storage = NullStorage()
+    elif settings.fsm_storage == "sqlite":
+        storage = SQLiteStorage(
+            db,
+            max_size=settings.fsm_cache_size,
+            ttl=settings.fsm_ttl,
+            flush_interval=settings.fsm_flush_interval_ms / 1000,
+        )
+    else:
+        storage = MemoryStorage()
+
+    dp = Dispatcher(storage=storage)
+
+    # Контент меняется без рестарта: SIGHUP или изменение файла
+    content_watcher = ContentWatcher(settings.content_path, settings.content_reload_interval)
+    dp.startup.register(content_watcher.start)
+    dp.shutdown.register(content_watcher.stop)
+
+    # Метрики: время хендлеров, запросы к API, БД, рассылка (METRICS_PORT=0 — выключены)
+    if settings.metrics_port:
+        metrics.enable()
+        handler_metrics = metrics.HandlerMetricsMiddleware()
+        dp.message.outer_middleware(handler_metrics)
+        dp.callback_query.outer_middleware(handler_metrics)
+        session.middleware(metrics.ApiMetricsMiddleware())
+        metrics.DB_PENDING.set_function(lambda: db.pending)
+        metrics.CONTENT_VERSION.set_function(lambda: content_bundle().version)
+
+    # Подписка на канал: кэш → таблица channel_members → API (только для новых пользователей)
+    members = ChannelMembers(
+        db,
+        fetch=lambda user_id: fetch_membership(bot, user_id),
+        ttl_positive=settings.sub_cache_ttl,
+        ttl_negative=settings.sub_cache_neg_ttl,
+        max_size=settings.sub_cache_size,
+    )
+    sub_cache = members.cache
+    metrics.SUB_CACHE_SIZE.set_function(lambda: len(sub_cache))
+
+    # Апдейты одного чата — по очереди, повторные нажатия кнопок — схлопываем
+    throttle = ThrottleMiddleware(window=settings.throttle_window_ms / 1000)
+    dp.message.outer_middleware(throttle)
+    dp.callback_query.outer_middleware(throttle)
+    if settings.metrics_port:
+        for kind in ("processed", "coalesced", "waited"):
+            metrics.THROTTLE_EVENTS.set_function(lambda k=kind: getattr(throttle.stats, k), kind)
+        outbound_stats = session.outbound.stats
+        for kind in ("requests", "retries", "rate_limited", "failed"):
+            metrics.OUTBOUND_EVENTS.set_function(lambda k=kind: getattr(outbound_stats, k), kind)
 
     # Подключаем автопроверку подписки (на всё)
-    dp.message.middleware(SubscriptionMiddleware())
-    dp.callback_query.middleware(SubscriptionMiddleware())
-
-    db = DB(settings.db_path)
-    db.init()
+    dp.message.middleware(SubscriptionMiddleware(sub_cache))
+    dp.callback_query.middleware(SubscriptionMiddleware(sub_cache))
 
     # ----- Scheduler -----
     scheduler = AsyncIOScheduler(timezone=ZoneInfo(settings.tz))
     scheduler.add_job(
         send_daily_tips,
-        trigger=CronTrigger(hour=settings.daily_hour, minute=settings.daily_minute),
-        args=[bot, db],
+        trigger=CronTrigger(minute="*"),
+        args=[bot, db, settings],
         id="daily_tips",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        resume_daily_tips,
+        args=[bot, db, settings],
+        id="resume_daily_tips",
         replace_existing=True
     )
-    scheduler.start()
+    scheduler.add_job(
+        members.reconcile,
+        trigger=IntervalTrigger(seconds=settings.members_recheck_interval),
+        kwargs=dict(
+            max_age=settings.members_recheck_age,
+            batch_size=settings.members_recheck_batch,
+            rate=settings.members_recheck_rate,
+        ),
+        id="reconcile_members",
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+    )
+    if run_scheduler:
+        scheduler.start()
 
     # ================= HANDLERS =================
 
+    stateless = settings.quiz_mode == "stateless"
+
     @dp.message(CommandStart())
     async def start_cmd(message: Message):
-        db.ensure_user(message.chat.id)
+        await db.ensure_user(message.chat.id)
 
-        # /start должен показать условия, если не подписан
-        if not await is_subscribed(bot, message.from_user.id):
+        # /start должен показать условия, если не подписан; подписку перепроверяем через API
+        if not await members.verify(message.from_user.id):
             await message.answer(SUB_TEXT, reply_markup=kb_subscribe())
             return
 
@@ -248,8 +494,8 @@ async def main():
 
     @dp.callback_query(F.data == "check_sub")
     async def check_subscription(cb: CallbackQuery):
-        # после нажатия “Я подписалась” — перепроверяем
-        if await is_subscribed(bot, cb.from_user.id):
+        # после нажатия “Я подписалась” — перепроверяем через API мимо кэша и таблицы
+        if await members.verify(cb.from_user.id):
             await cb.message.answer(
                 "✨ Спасибо за подписку!\n"
                 "Теперь бот доступен 💄\n\n"
@@ -264,26 +510,66 @@ async def main():
             )
         await cb.answer()
 
+    # ===== Channel membership (join / leave) =====
+
+    @dp.chat_member(is_channel_event)
+    async def on_channel_member(event: ChatMemberUpdated):
+        await members.on_update(event)
+
     @dp.message(Command("my"))
     async def my_cmd(message: Message):
-        db.ensure_user(message.chat.id)
-        last = db.get_last_result(message.chat.id)
+        await db.ensure_user(message.chat.id)
+        plan = await db.get_saved_plan(message.chat.id)
+        last = None
+        if plan and plan.answers_code is not None and plan.version == CONTENT_VERSION:
+            # План хранится ссылкой — рендерим актуальный текст из кэша
+            last = build_text(decode_answers(plan.answers_code), LEVEL_OPTIONS[plan.level])
+        elif plan and plan.text:
+            last = plan.text
         if not last:
             await message.answer("Пока нет сохранённого результата. Нажми /start 💄")
             return
         await message.answer("💾 **Твой сохранённый план:**\n\n" + last)
 
+    @dp.message(Command("tz"))
+    async def tz_cmd(message: Message):
+        chat_id = message.chat.id
+        args = (message.text or "").split()[1:]
+        if not args:
+            tz, minute = await db.get_tips_time(chat_id)
+            schedule = tip_schedule(settings)
+            await message.answer(
+                f"🕙 Советы приходят в {format_minute(schedule.minute_for(chat_id, minute))} "
+                f"(`{tz or settings.tz}`).\n"
+                "Поменять: `/tz Europe/Moscow 09:30` (время можно не указывать)."
+            )
+            return
+        parsed = parse_tz_args(args)
+        if parsed is None:
+            await message.answer("Не поняла 🙈 Пример: `/tz Europe/Moscow 09:30`")
+            return
+        tz, minute = parsed
+        if minute is None:
+            # Меняется только пояс — время оставляем прежним
+            _, minute = await db.get_tips_time(chat_id)
+        await db.set_tips_time(chat_id, tz, minute)
+        when = format_minute(tip_schedule(settings).minute_for(chat_id, minute))
+        await message.answer(f"Готово ✨ Буду присылать советы в {when} (`{tz}`).")
+
     @dp.message(Command("stop"))
     async def stop_cmd(message: Message):
-        db.ensure_user(message.chat.id)
-        db.set_tips(message.chat.id, False)
+        await db.set_tips(message.chat.id, False)
         await message.answer("Готово 🙂 Ежедневные советы отключены. Включить снова можно через «Получать советы».")
 
     # ===== Start quiz =====
 
     @dp.callback_query(F.data == "start_quiz")
     async def start_quiz(cb: CallbackQuery, state: FSMContext):
-        db.ensure_user(cb.message.chat.id)
+        await db.ensure_user(cb.message.chat.id)
+        if stateless:
+            await cb.message.answer("Какая у тебя кожа?", reply_markup=kb_quiz_stateless(""))
+            await cb.answer()
+            return
         await state.clear()
         await state.set_state(Quiz.skin)
         await cb.message.answer("Какая у тебя кожа?", reply_markup=kb_skin())
@@ -291,12 +577,18 @@ async def main():
 
     # ===== Restart quiz =====
 
-    @dp.callback_query(F.data == "restart")
-    async def restart_quiz(cb: CallbackQuery, state: FSMContext):
-        db.ensure_user(cb.message.chat.id)
+    async def ask_quiz_again(cb: CallbackQuery, state: FSMContext):
+        if stateless:
+            await cb.message.answer("Начнём заново 💄\nКакая у тебя кожа?", reply_markup=kb_quiz_stateless(""))
+            return
         await state.clear()
         await state.set_state(Quiz.skin)
         await cb.message.answer("Начнём заново 💄\nКакая у тебя кожа?", reply_markup=kb_skin())
+
+    @dp.callback_query(F.data == "restart")
+    async def restart_quiz(cb: CallbackQuery, state: FSMContext):
+        await db.ensure_user(cb.message.chat.id)
+        await ask_quiz_again(cb, state)
         await cb.answer()
 
     @dp.callback_query(F.data.startswith("skin:"))
@@ -329,10 +621,22 @@ async def main():
 
     # ===== Final (short) + save answers for Detail =====
 
+    async def send_result(cb: CallbackQuery, answers: Answers):
+        code = encode_answers(answers)
+        text_short = build_text(answers, level="short")
+        await cb.message.answer(text_short, reply_markup=kb_result(code))
+
+        await db.save_last_answers(cb.message.chat.id, code)
+
     @dp.callback_query(F.data.startswith("occ:"))
     async def on_occasion(cb: CallbackQuery, state: FSMContext):
-        db.ensure_user(cb.message.chat.id)
         data = await state.get_data()
+        # Кнопка из старого сообщения: в stateless-режиме (NullStorage) или после истечения
+        # FSM_TTL предыдущих ответов нет — начинаем квиз заново
+        if not all(name in data for name in ("skin", "tone", "undertone", "eyes")):
+            await ask_quiz_again(cb, state)
+            await cb.answer("Кнопка устарела — начни заново 💄")
+            return
 
         answers = Answers(
             skin=data["skin"],
@@ -342,40 +646,41 @@ async def main():
             occasion=cb.data.split(":")[1],
         )
 
-        text_short = build_text(answers, level="short")
-        await cb.message.answer(text_short, reply_markup=kb_result())
-
-        payload = {
-            "skin": answers.skin,
-            "tone": answers.tone,
-            "undertone": answers.undertone,
-            "eyes": answers.eyes,
-            "occasion": answers.occasion,
-        }
-        db.save_last_answers(cb.message.chat.id, json.dumps(payload, ensure_ascii=False))
+        await send_result(cb, answers)
 
         await state.clear()
         await cb.answer()
 
+    # ===== Stateless quiz (progress lives in callback_data) =====
+
+    @dp.callback_query(F.data.startswith(STATELESS_PREFIX))
+    async def on_quiz_stateless(cb: CallbackQuery):
+        digits = cb.data[len(STATELESS_PREFIX):]
+        if not digits or not answer_digits_valid(digits):
+            await cb.answer()
+            return
+
+        if len(digits) < len(QUIZ_STEPS):
+            question = QUIZ_STEPS[len(digits)][2]
+            await cb.message.answer(question, reply_markup=kb_quiz_stateless(digits))
+            await cb.answer()
+            return
+
+        await send_result(cb, answers_from_digits(digits))
+        await cb.answer()
+
     # ===== Detail button =====
 
     @dp.callback_query(F.data == "detail")
     async def on_detail(cb: CallbackQuery):
-        db.ensure_user(cb.message.chat.id)
-        raw = db.get_last_answers(cb.message.chat.id)
-        if not raw:
+        await db.ensure_user(cb.message.chat.id)
+        code = await db.get_last_answers(cb.message.chat.id)
+        if code is None:
             await cb.message.answer("Не вижу последнего результата. Нажми /start и пройди подбор 💄")
             await cb.answer()
             return
 
-        data = json.loads(raw)
-        answers = Answers(
-            skin=data["skin"],
-            tone=data["tone"],
-            undertone=data["undertone"],
-            eyes=data["eyes"],
-            occasion=data["occasion"],
-        )
+        answers = decode_answers(code)
 
         text_full = build_text(answers, level="full")
         await cb.message.answer(text_full)
@@ -383,11 +688,16 @@ async def main():
 
     # ===== Save =====
 
-    @dp.callback_query(F.data == "save")
+    @dp.callback_query(F.data.startswith("save"))
     async def on_save(cb: CallbackQuery):
-        db.ensure_user(cb.message.chat.id)
-        if cb.message.text:
-            db.save_last_result(cb.message.chat.id, cb.message.text)
+        # Кнопка «Сохранить» есть только под коротким планом; код ответов — в callback_data.
+        # У кнопок из старых сообщений ("save" без кода) сохраняем текст самого сообщения.
+        raw = cb.data[len(SAVE_PREFIX):] if cb.data.startswith(SAVE_PREFIX) else ""
+        if raw.isdigit() and int(raw) < ANSWERS_SPACE:
+            await db.save_plan(cb.message.chat.id, int(raw), LEVEL_OPTIONS.index("short"), CONTENT_VERSION)
+            await cb.message.answer("💾 Сохранила! Напиши /my, чтобы посмотреть позже.")
+        elif cb.message.text:
+            await db.save_last_result(cb.message.chat.id, cb.message.text)
             await cb.message.answer("💾 Сохранила! Напиши /my, чтобы посмотреть позже.")
         await cb.answer()
 
@@ -404,9 +714,11 @@ async def main():
 
     @dp.callback_query(F.data == "tips_yes")
     async def tips_yes(cb: CallbackQuery):
-        db.ensure_user(cb.message.chat.id)
-        db.set_tips(cb.message.chat.id, True)
-        await cb.message.answer("✨ Отлично! Буду присылать советы каждый день.\nОтключить можно командой /stop.")
+        await db.set_tips(cb.message.chat.id, True)
+        await cb.message.answer(
+            "✨ Отлично! Буду присылать советы каждый день.\n"
+            "Время можно поменять командой /tz, отключить — командой /stop."
+        )
         await cb.answer()
 
     @dp.callback_query(F.data == "tips_no")
@@ -414,11 +726,47 @@ async def main():
         await cb.message.answer("Хорошо 🙂 Если захочешь — включишь позже в любой момент.")
         await cb.answer()
 
+    return bot, dp, db, storage
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    settings = get_settings()
+
+    # Несколько процессов: фронт принимает апдейты и раздаёт их воркерам по chat_id
+    if settings.workers > 1:
+        await run_sharded(settings, create_bot)
+        return
+
+    bot, dp, db, storage = await create_bot(settings)
+    metrics_runner = None
+    if settings.metrics_port:
+        metrics_runner = await start_metrics_server(settings.metrics_host, settings.metrics_port)
+
     # ================= START =================
     try:
-        await dp.start_polling(bot)
+        if settings.bot_mode == "webhook":
+            await run_webhook(
+                dp,
+                bot,
+                url=settings.webhook_url,
+                host=settings.webhook_host,
+                port=settings.webhook_port,
+                path=settings.webhook_path,
+                secret=settings.webhook_secret,
+                queue_size=settings.webhook_queue_size,
+                concurrency=settings.webhook_concurrency,
+            )
+        else:
+            # Если раньше был webhook, Telegram не отдаст getUpdates, пока его не снять
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
-        db.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        # close() сбрасывает отложенные записи одной транзакцией
+        await storage.close()
+        await db.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from aiogram.types import ChatMember, ChatMemberUpdated
+
+from .db import AsyncDB
+from .ratelimit import TokenBucket
+from .subcache import SubscriptionCache
+
+logger = logging.getLogger(__name__)
+
+MEMBER_STATUSES = ("member", "administrator", "creator")
+
+
+def is_member(member: ChatMember) -> bool:
+    if member.status in MEMBER_STATUSES:
+        return True
+    # restricted — может быть как участником, так и нет
+    return member.status == "restricted" and bool(getattr(member, "is_member", False))
+
+
+class ChannelMembers:
+    """
+    Подписка на канал по локальной таблице channel_members.
+    - таблица обновляется из chat_member-апдейтов канала (вступил / вышел);
+    - API (get_chat_member) вызывается только для пользователей, которых в таблице нет,
+      и при явной перепроверке (/start и кнопка «Я подписалась»);
+    - reconcile() понемногу сверяет с API давно не проверявшиеся записи
+      (на случай пропущенных апдейтов);
+    - перед таблицей — SubscriptionCache (LRU в памяти), на событиях он обновляется сразу.
+    fetch(user_id) -> True / False / None (None — проверить не удалось, в таблицу не пишем).
+    """
+
+    def __init__(
+        self,
+        db: AsyncDB,
+        fetch: Callable[[int], Awaitable[Optional[bool]]],
+        ttl_positive: float = 300.0,
+        ttl_negative: float = 15.0,
+        max_size: int = 100_000,
+    ):
+        self.db = db
+        self.fetch = fetch
+        self.cache = SubscriptionCache(
+            fetch=self._lookup,
+            ttl_positive=ttl_positive,
+            ttl_negative=ttl_negative,
+            max_size=max_size,
+        )
+
+    async def check(self, user_id: int) -> bool:
+        return await self.cache.check(user_id)
+
+    async def _lookup(self, user_id: int) -> bool:
+        known = await self.db.get_channel_member(user_id)
+        if known is not None:
+            return known
+        return await self._verify(user_id)
+
+    async def _verify(self, user_id: int) -> bool:
+        value = await self.fetch(user_id)
+        if value is None:
+            return False
+        await self.db.set_channel_members([(user_id, value, time.time())])
+        return value
+
+    async def verify(self, user_id: int) -> bool:
+        """
+        Проверка мимо таблицы и кэша (/start, «Я подписалась»): ловит и подписку, и отписку,
+        даже если апдейт канала был пропущен. Если API не ответил — что знаем из таблицы/кэша.
+        """
+        value = await self.fetch(user_id)
+        if value is None:
+            return await self.check(user_id)
+        await self.db.set_channel_members([(user_id, value, time.time())])
+        self.cache.put(user_id, value)
+        return value
+
+    async def on_update(self, event: ChatMemberUpdated) -> None:
+        user_id = event.new_chat_member.user.id
+        value = is_member(event.new_chat_member)
+        await self.db.set_channel_members([(user_id, value, time.time())])
+        self.cache.put(user_id, value)
+
+    async def reconcile(self, max_age: float, batch_size: int = 500, rate: float = 5.0) -> int:
+        """Сверяет с API до batch_size записей старше max_age секунд; не чаще rate запросов/сек."""
+        stale = await self.db.get_stale_channel_members(time.time() - max_age, batch_size)
+        bucket = TokenBucket(rate)
+        rows = []
+        for user_id in stale:
+            await bucket.acquire()
+            value = await self.fetch(user_id)
+            if value is None:
+                continue
+            rows.append((user_id, value, time.time()))
+            self.cache.put(user_id, value)
+        await self.db.set_channel_members(rows)
+        if stale:
+            logger.info("Re-checked %d of %d stale channel members", len(rows), len(stale))
+        return len(rows)
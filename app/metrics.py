@@ -0,0 +1,305 @@
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED, CancelHandler, SkipHandler
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм задержек (секунды)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class Registry:
+    """
+    Реестр метрик. Пока enabled=False (METRICS_PORT=0), inc/observe/set сразу выходят —
+    инструментированный код почти ничего не платит.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric") -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(n, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for n, v in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not self.registry.enabled:
+            return
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Значение задаётся set/inc или функцией (set_function), которая вызывается при сборе."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not self.registry.enabled:
+            return
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set_function(self, fn: Callable[[], float], *labels: str) -> None:
+        self._functions[labels] = fn
+
+    def samples(self) -> List[str]:
+        values = dict(self._values)
+        for labels, fn in self._functions.items():
+            try:
+                values[labels] = float(fn())
+            except Exception:
+                logger.exception("Gauge %s callback failed", self.name)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по корзинам (последняя — +Inf), сумма, количество]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (le,))} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: LabelValues):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+# ================= Метрики бота =================
+
+HANDLER_SECONDS = Histogram(
+    "bot_handler_seconds", "Update handling time by handler key (callback prefix or command)",
+    ("handler",),
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Updates whose handler raised", ("handler",)
+)
+API_REQUESTS = Counter(
+    "bot_api_requests_total", "Bot API requests (every attempt, including retries)", ("method",)
+)
+API_ERRORS = Counter(
+    "bot_api_errors_total", "Bot API errors by method and exception type", ("method", "error")
+)
+API_SECONDS = Histogram(
+    "bot_api_request_seconds", "Bot API request time", ("method",)
+)
+SUBSCRIPTION_CHECKS = Counter(
+    "bot_subscription_checks_total", "getChatMember subscription checks by result", ("result",)
+)
+DB_SECONDS = Histogram(
+    "bot_db_operation_seconds", "Time spent in DB methods (on the DB thread)", ("operation",)
+)
+DB_PENDING = Gauge(
+    "bot_db_pending_users", "Users with write-behind changes not yet flushed"
+)
+BROADCAST_MESSAGES = Counter(
+    "bot_broadcast_messages_total", "Daily tip deliveries by outcome", ("status",)
+)
+BROADCAST_RUNNING = Gauge(
+    "bot_broadcast_running", "1 while a broadcast job is running"
+)
+BROADCAST_PROGRESS = Gauge(
+    "bot_broadcast_recipients", "Current broadcast job recipients by state", ("state",)
+)
+THROTTLE_EVENTS = Gauge(
+    "bot_throttle_updates", "Per-chat throttle counters (processed / coalesced / waited)", ("kind",)
+)
+OUTBOUND_EVENTS = Gauge(
+    "bot_outbound_events", "Outbound layer counters (requests / retries / rate_limited / failed)", ("kind",)
+)
+SUB_CACHE_SIZE = Gauge(
+    "bot_subscription_cache_entries", "Entries in the subscription cache"
+)
+CONTENT_VERSION = Gauge(
+    "bot_content_version", "Version of the content bundle in use"
+)
+
+
+# ================= HTTP =================
+
+async def start_metrics_server(host: str, port: int, registry: Registry = REGISTRY) -> web.AppRunner:
+    """Отдаёт метрики на http://host:port/metrics."""
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics on http://%s:%d/metrics", host, port)
+    return runner
+
+
+def enable(registry: Registry = REGISTRY) -> None:
+    registry.enabled = True
+
+
+# ================= Middlewares =================
+
+def handler_key(event) -> str:
+    """Метка хендлера: префикс callback_data («skin», «qz», «detail») или команда («/start»)."""
+    data: Optional[str] = getattr(event, "data", None)
+    if data is not None:
+        return data.split(":", 1)[0]
+    text: Optional[str] = getattr(event, "text", None)
+    if text and text.startswith("/"):
+        return text.split(maxsplit=1)[0].split("@", 1)[0]
+    return "message"
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Время обработки апдейта и ошибки хендлеров (outer middleware на message/callback_query)."""
+
+    async def __call__(self, handler, event, data):
+        key = handler_key(event)
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except (CancelHandler, SkipHandler):
+            # Обычный поток управления (например, не подписан на канал) — не ошибка
+            HANDLER_SECONDS.observe(time.perf_counter() - started, "cancelled")
+            raise
+        except Exception:
+            HANDLER_ERRORS.inc(key)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+        # Апдейты, которые никто не обработал, сводим в одну метку — иначе метки
+        # размножались бы от произвольного текста/callback_data
+        HANDLER_SECONDS.observe(elapsed, "unhandled" if result is UNHANDLED else key)
+        return result
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Запросы к Bot API по методам: количество, время, ошибки (подключается после OutboundMiddleware)."""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        API_REQUESTS.inc(name)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(name, type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, name)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from aiohttp import ClientConnectorError
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+
+from .ratelimit import KeyedRateLimiter, PriorityTokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Методы, которые отправляют сообщение в чат и попадают под лимиты Telegram
+LIMITED_PREFIXES = ("send", "copy", "forward")
+
+
+def _not_sent(error: TelegramNetworkError) -> bool:
+    """Запрос точно не ушёл: не удалось установить соединение (исходная ошибка — в __context__)."""
+    return isinstance(error.__context__, ClientConnectorError)
+
+
+# Фоновая полоса (массовые рассылки) — выставляется на время рассылки
+_bulk: ContextVar[bool] = ContextVar("outbound_bulk", default=False)
+
+
+@contextmanager
+def bulk_traffic() -> Iterator[None]:
+    """Все запросы к API внутри блока (и в созданных в нём задачах) идут фоновой полосой."""
+    token = _bulk.set(True)
+    try:
+        yield
+    finally:
+        _bulk.reset(token)
+
+
+@dataclass
+class OutboundStats:
+    requests: int = 0
+    retries: int = 0
+    rate_limited: int = 0
+    failed: int = 0
+
+
+class OutboundMiddleware(BaseRequestMiddleware):
+    """
+    Единая точка для всех исходящих запросов бота (подключается в bot.session.middleware):
+    - общий token bucket на бота и лимит на чат для методов, которые шлют сообщения;
+    - ответы пользователям идут раньше рассылки (см. bulk_traffic);
+    - RetryAfter → пауза всего bucket и повтор с джиттером;
+    - сетевые ошибки → повтор с backoff, но для send*/copy*/forward* — только если запрос
+      точно не ушёл (ошибка соединения): после таймаута сообщение могло уже дойти, и повтор
+      прислал бы пользователю дубль.
+    Хендлерам и рассылке больше не нужно самим обрабатывать 429.
+    """
+
+    def __init__(
+        self,
+        rate: float = 28.0,
+        chat_rate: float = 1.0,
+        chat_burst: int = 3,
+        max_retries: int = 3,
+        max_retry_after: float = 60.0,
+        jitter: float = 0.5,
+    ):
+        self.bucket = PriorityTokenBucket(rate)
+        self.chat_limiter = KeyedRateLimiter(chat_rate, burst=chat_burst)
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.jitter = jitter
+        self.stats = OutboundStats()
+
+    async def __call__(self, make_request, bot, method):
+        limited = method.__api_method__.startswith(LIMITED_PREFIXES)
+        chat_id = getattr(method, "chat_id", None)
+        bulk = _bulk.get()
+
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                if isinstance(chat_id, int):
+                    await self.chat_limiter.acquire(chat_id)
+                await self.bucket.acquire(bulk=bulk)
+            self.stats.requests += 1
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.stats.rate_limited += 1
+                if attempt == self.max_retries or e.retry_after > self.max_retry_after:
+                    self.stats.failed += 1
+                    raise
+                logger.warning(
+                    "%s hit flood control, retrying in %ss", method.__api_method__, e.retry_after
+                )
+                self.bucket.pause(e.retry_after)
+                delay = e.retry_after
+            except TelegramNetworkError as e:
+                if attempt == self.max_retries or (limited and not _not_sent(e)):
+                    self.stats.failed += 1
+                    raise
+                logger.debug("%s network error (attempt %d): %s", method.__api_method__, attempt + 1, e)
+                delay = min(2 ** attempt, 30)
+            self.stats.retries += 1
+            await asyncio.sleep(delay + random.uniform(0, self.jitter))
+
+
+class PooledSession(AiohttpSession):
+    """AiohttpSession с настраиваемым пулом keep-alive соединений к Bot API."""
+
+    def __init__(self, limit: int = 100, keepalive_timeout: float = 60.0, **kwargs):
+        super().__init__(limit=limit, **kwargs)
+        self._connector_init["keepalive_timeout"] = keepalive_timeout
+        self.outbound: Optional[OutboundMiddleware] = None
+
+
+def create_session(
+    pool_size: int = 100,
+    keepalive_timeout: float = 60.0,
+    api_url: str = "",
+    **limits,
+) -> PooledSession:
+    """
+    Сессия бота с пулом соединений и OutboundMiddleware (параметры лимитов — в limits).
+    api_url — свой сервер Bot API (например, локальный bench/fake_api.py) вместо api.telegram.org.
+    """
+    session = PooledSession(limit=pool_size, keepalive_timeout=keepalive_timeout)
+    if api_url:
+        session.api = TelegramAPIServer.from_base(api_url)
+    session.outbound = OutboundMiddleware(**limits)
+    session.middleware(session.outbound)
+    return session
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket: rate токенов в секунду, не больше capacity «про запас».
+    pause() замораживает выдачу токенов (например, после RetryAfter от Telegram).
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            self._tokens = 0.0
+
+
+class PriorityTokenBucket(TokenBucket):
+    """
+    Token bucket с двумя полосами: обычные запросы всегда идут раньше фоновых (bulk).
+    Фоновые запросы стоят в своей очереди и пропускают вперёд всех ожидающих обычных,
+    поэтому массовая рассылка не задерживает ответы пользователям.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        super().__init__(rate, capacity)
+        self._urgent = 0
+        self._bulk_lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0, bulk: bool = False) -> None:
+        if not bulk:
+            self._urgent += 1
+            try:
+                await super().acquire(tokens)
+            finally:
+                self._urgent -= 1
+            return
+        # В общей очереди одновременно не больше одного фонового запроса
+        async with self._bulk_lock:
+            while self._urgent:
+                await asyncio.sleep(1.0 / self.rate)
+            await super().acquire(tokens)
+
+
+class KeyedRateLimiter:
+    """
+    Минимальный интервал между событиями для одного ключа (например, chat_id),
+    с разрешённой «пачкой» до burst событий подряд.
+    Хранит не больше max_keys последних ключей.
+    """
+
+    def __init__(self, rate: float, max_keys: int = 100_000, burst: int = 1):
+        self.interval = 1.0 / rate
+        self.max_keys = max_keys
+        self.burst = burst
+        self._next: "OrderedDict[int, float]" = OrderedDict()
+
+    async def acquire(self, key: int) -> None:
+        now = time.monotonic()
+        ready_at = max(now, self._next.get(key, 0.0))
+        self._next[key] = ready_at + self.interval
+        self._next.move_to_end(key)
+        while len(self._next) > self.max_keys:
+            self._next.popitem(last=False)
+        wait = ready_at - now - (self.burst - 1) * self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
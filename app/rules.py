@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from itertools import product
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+# Правила рекомендаций (какой набор фото, какие строки плана) — раздел "rules" в content.json.
+# Каждое правило — {"if": {поле: [варианты]}, "then": значение}; срабатывает первое
+# подходящее, правило без "if" — значение по умолчанию.
+
+# Имя набора правил -> тип значения
+RULE_TYPES = {
+    "photo_set": int,
+    "skin_line": str,
+    "undertone_line": str,
+    "palette_hint": str,
+    "eyes_short": str,
+    "eyes_full": str,
+    "lips_line": str,
+    "main_mistake": str,
+    "formula_line": str,
+}
+
+Fields = Sequence[Tuple[str, Sequence[str]]]
+
+
+class RuleTable:
+    """
+    Набор правил, скомпилированный в плотную таблицу: индекс — ответы, упакованные
+    так же, как encode_answers, но только по полям, которые правила проверяют.
+    get() — O(число полей), без перебора правил.
+    """
+
+    __slots__ = ("name", "rules", "fields", "table")
+
+    def __init__(self, name: str, rules: Tuple[Tuple[Dict[str, frozenset], Any], ...], fields: Fields):
+        self.name = name
+        self.rules = rules
+        used = {field for when, _ in rules for field in when}
+        # (поле, вариант -> индекс, число вариантов) в порядке полей ответов
+        self.fields = tuple(
+            (field, {v: i for i, v in enumerate(opts)}, len(opts))
+            for field, opts in fields
+            if field in used
+        )
+        table = []
+        for combo in product(*(tuple(index) for _, index, _ in self.fields)):
+            values = {field: value for (field, _, _), value in zip(self.fields, combo)}
+            try:
+                table.append(self.evaluate(values))
+            except KeyError:
+                raise ValueError(f"Rules {name!r} do not cover {values}") from None
+        self.table = tuple(table)
+
+    def evaluate(self, values: Mapping[str, str]) -> Any:
+        """Правила по порядку — для ответов вне таблицы (нестандартные варианты)."""
+        for when, then in self.rules:
+            if all(values.get(field) in allowed for field, allowed in when.items()):
+                return then
+        raise KeyError(self.name)
+
+    def get(self, values: Mapping[str, str]) -> Any:
+        idx = 0
+        try:
+            for field, index, size in self.fields:
+                idx = idx * size + index[values[field]]
+        except KeyError:
+            return self.evaluate(values)
+        return self.table[idx]
+
+
+@dataclass(frozen=True)
+class Rules:
+    photo_set: RuleTable
+    skin_line: RuleTable
+    undertone_line: RuleTable
+    palette_hint: RuleTable
+    eyes_short: RuleTable
+    eyes_full: RuleTable
+    lips_line: RuleTable
+    main_mistake: RuleTable
+    formula_line: RuleTable
+    # Шаги плана по зонам лица (по строке на шаг) и приписка под повод
+    face_steps: Tuple[RuleTable, ...]
+    face_extra: RuleTable
+
+
+def _compile_rules(
+    name: str, raw: Any, value_type: type, fields: Fields, allowed_values: Optional[Iterable] = None
+) -> RuleTable:
+    options = dict(fields)
+    allowed = set(allowed_values) if allowed_values is not None else None
+    if not isinstance(raw, list) or not raw:
+        raise ValueError(f"Rules {name!r} must be a non-empty list")
+    rules = []
+    for i, rule in enumerate(raw):
+        where = f"{name}[{i}]"
+        if not isinstance(rule, dict) or "then" not in rule or set(rule) - {"if", "then"}:
+            raise ValueError(f"{where}: expected {{'if': ..., 'then': ...}}")
+        then = rule["then"]
+        if type(then) is not value_type:
+            raise ValueError(f"{where}: 'then' must be {value_type.__name__}")
+        if allowed is not None and then not in allowed:
+            raise ValueError(f"{where}: unknown value {then!r}")
+        when = rule.get("if", {})
+        if not isinstance(when, dict):
+            raise ValueError(f"{where}: 'if' must be an object")
+        compiled = {}
+        for field, values in when.items():
+            if field not in options:
+                raise ValueError(f"{where}: unknown field {field!r}")
+            if not isinstance(values, list) or not values or not all(isinstance(v, str) for v in values):
+                raise ValueError(f"{where}.if.{field} must be a non-empty list of strings")
+            unknown = set(values) - set(options[field])
+            if unknown:
+                raise ValueError(f"{where}: unknown {field} {sorted(unknown)}")
+            compiled[field] = frozenset(values)
+        rules.append((compiled, then))
+    return RuleTable(name, tuple(rules), fields)
+
+
+def compile_rules(doc: Any, fields: Fields, photo_sets: Optional[Iterable[int]] = None) -> Rules:
+    """Проверяет раздел "rules" бандла и собирает таблицы; ValueError с указанием места ошибки."""
+    raw = doc.get("rules")
+    if not isinstance(raw, dict):
+        raise ValueError("Content bundle must have a 'rules' object")
+    expected = set(RULE_TYPES) | {"face_steps"}
+    if set(raw) != expected:
+        raise ValueError(
+            f"Rules mismatch: missing {sorted(expected - set(raw))}, unknown {sorted(set(raw) - expected)}"
+        )
+    tables = {
+        name: _compile_rules(
+            name, raw[name], value_type, fields, photo_sets if name == "photo_set" else None
+        )
+        for name, value_type in RULE_TYPES.items()
+    }
+    face = raw["face_steps"]
+    if not isinstance(face, dict) or set(face) != {"steps", "extra"} or not isinstance(face["steps"], list):
+        raise ValueError("face_steps must be {'steps': [rules, ...], 'extra': rules}")
+    steps = tuple(
+        _compile_rules(f"face_steps.steps[{i}]", step, str, fields) for i, step in enumerate(face["steps"])
+    )
+    extra = _compile_rules("face_steps.extra", face["extra"], str, fields)
+    return Rules(face_steps=steps, face_extra=extra, **tables)
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+from typing import Any, Awaitable, Callable, Dict, List, Set
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.types import Update
+
+from .config import Settings
+from .metrics import start_metrics_server
+from .outbound import create_session
+from .webhook import SECRET_HEADER, UpdateQueue, wait_for_stop_signal
+
+logger = logging.getLogger(__name__)
+
+# create_bot(settings, run_scheduler) -> (bot, dp, db, storage)
+BotFactory = Callable[..., Awaitable[tuple]]
+
+
+def raw_update_chat_id(data: Dict[str, Any]) -> int:
+    """chat_id «сырого» апдейта (dict из JSON) без разбора через pydantic."""
+    for key, event in data.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        if key == "chat_member":
+            # Вступление/выход из канала — к воркеру пользователя, чтобы обновился его кэш подписки
+            return int(event["new_chat_member"]["user"]["id"])
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat:
+            return int(chat["id"])
+        user = event.get("from")
+        if user:
+            return int(user["id"])
+    return 0
+
+
+class ShardRouter:
+    """Раскладывает апдейты по очередям воркер-процессов: chat_id % N."""
+
+    def __init__(self, queues: List[Any]):
+        self.queues = queues
+
+    def _queue_for(self, data: Dict[str, Any]):
+        return self.queues[raw_update_chat_id(data) % len(self.queues)]
+
+    def offer(self, data: Dict[str, Any]) -> bool:
+        try:
+            self._queue_for(data).put_nowait(data)
+        except queue.Full:
+            return False
+        return True
+
+    async def submit(self, data: Dict[str, Any]) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._queue_for(data).put, data)
+
+
+# ================= WORKER =================
+
+def worker_process(index: int, settings: Settings, factory: BotFactory, updates, ready) -> None:
+    # Останавливает воркеры фронт (через None в очереди), сигналы им не нужны
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # SIGHUP до старта диспетчера не должен убить воркер; дальше его ловит ContentWatcher
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"[worker {index}] %(levelname)s:%(name)s:%(message)s",
+    )
+    asyncio.run(_worker_main(index, settings, factory, updates, ready))
+
+
+async def _worker_main(index: int, settings: Settings, factory: BotFactory, updates, ready) -> None:
+    # Рассылка советов и прочие задачи планировщика — только в воркере 0
+    bot, dp, db, storage = await factory(settings, run_scheduler=index == 0)
+    # У каждого воркера свои метрики: METRICS_PORT + номер воркера
+    metrics_runner = None
+    if settings.metrics_port:
+        metrics_runner = await start_metrics_server(settings.metrics_host, settings.metrics_port + index)
+    local = UpdateQueue(
+        dp, bot, queue_size=settings.webhook_queue_size, concurrency=settings.webhook_concurrency
+    )
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    local.start()
+    ready.put((index, dp.resolve_used_update_types()))
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+            await local.submit(Update.model_validate(data, context={"bot": bot}))
+    finally:
+        await local.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
+        await storage.close()
+        await db.close()
+
+
+# ================= FRONT =================
+
+async def _poll(bot: Bot, router: ShardRouter, allowed_updates: List[str]) -> None:
+    await bot.delete_webhook()
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=25, allowed_updates=allowed_updates
+            )
+        except Exception:
+            logger.exception("getUpdates failed")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            await router.submit(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+
+
+async def _serve_webhook(
+    bot: Bot, router: ShardRouter, settings: Settings, allowed_updates: List[str]
+) -> web.AppRunner:
+    async def handle(request: web.Request) -> web.Response:
+        if settings.webhook_secret and request.headers.get(SECRET_HEADER) != settings.webhook_secret:
+            return web.Response(status=401)
+        try:
+            data = await request.json()
+        except Exception:
+            return web.Response(status=400)
+        if not router.offer(data):
+            return web.Response(status=503)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(settings.webhook_path, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, settings.webhook_host, settings.webhook_port).start()
+    await bot.set_webhook(
+        settings.webhook_url.rstrip("/") + settings.webhook_path,
+        secret_token=settings.webhook_secret or None,
+        allowed_updates=allowed_updates,
+    )
+    return runner
+
+
+def _forward_signal(procs: List[Any], sig: int) -> None:
+    for proc in procs:
+        if proc.is_alive():
+            os.kill(proc.pid, sig)
+
+
+async def run_sharded(settings: Settings, factory: BotFactory, ready_timeout: float = 120.0) -> None:
+    """
+    Фронт-процесс: принимает апдейты (polling или webhook) и раздаёт их N воркерам по
+    chat_id % N, поэтому все апдейты одного чата обрабатываются одним процессом по порядку.
+    У каждого воркера свой диспетчер и своё соединение с SQLite (WAL).
+    """
+    ctx = mp.get_context("spawn")
+    queues = [ctx.Queue(maxsize=settings.webhook_queue_size) for _ in range(settings.workers)]
+    ready = ctx.Queue()
+    procs = [
+        ctx.Process(
+            target=worker_process,
+            args=(i, settings, factory, queues[i], ready),
+            name=f"bot-worker-{i}",
+        )
+        for i in range(settings.workers)
+    ]
+    for proc in procs:
+        proc.start()
+
+    loop = asyncio.get_running_loop()
+    # SIGHUP (перезагрузка контента) пересылаем воркерам: контент у каждого свой
+    if hasattr(signal, "SIGHUP"):
+        loop.add_signal_handler(signal.SIGHUP, _forward_signal, procs, signal.SIGHUP)
+    router = ShardRouter(queues)
+    bot = Bot(token=settings.bot_token, session=create_session(api_url=settings.bot_api_url))
+    runner = None
+    try:
+        allowed: Set[str] = set()
+        for _ in procs:
+            try:
+                _, types = await loop.run_in_executor(None, ready.get, True, ready_timeout)
+            except queue.Empty:
+                raise RuntimeError("Bot workers did not start in time") from None
+            allowed.update(types)
+        allowed_updates = sorted(allowed)
+        logger.info("%d workers ready, receiving %s", len(procs), allowed_updates)
+
+        if settings.bot_mode == "webhook":
+            runner = await _serve_webhook(bot, router, settings, allowed_updates)
+            await wait_for_stop_signal()
+        else:
+            poller = asyncio.create_task(_poll(bot, router, allowed_updates))
+            stopper = asyncio.create_task(wait_for_stop_signal())
+            await asyncio.wait([poller, stopper], return_when=asyncio.FIRST_COMPLETED)
+            for task in (poller, stopper):
+                task.cancel()
+            await asyncio.gather(poller, stopper, return_exceptions=True)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+        for q in queues:
+            try:
+                await loop.run_in_executor(None, q.put, None, True, 5)
+            except queue.Full:
+                pass  # воркер завис или умер — ниже он будет остановлен
+        for proc in procs:
+            await loop.run_in_executor(None, proc.join, 30)
+            if proc.is_alive():
+                proc.terminate()
+        await bot.session.close()
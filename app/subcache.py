@@ -0,0 +1,70 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Tuple
+
+
+class SubscriptionCache:
+    """
+    Кэш результатов проверки подписки (user_id -> bool).
+    Отдельные TTL для «подписан» и «не подписан», ограниченный размер (LRU)
+    и single-flight: параллельные запросы одного пользователя ждут один и тот же вызов API.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[int], Awaitable[bool]],
+        ttl_positive: float = 300.0,
+        ttl_negative: float = 15.0,
+        max_size: int = 100_000,
+    ):
+        self.fetch = fetch
+        self.ttl_positive = ttl_positive
+        self.ttl_negative = ttl_negative
+        self.max_size = max_size
+        # user_id -> (результат, момент истечения)
+        self._entries: "OrderedDict[int, Tuple[bool, float]]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+
+    async def check(self, user_id: int) -> bool:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(user_id)
+                return value
+            del self._entries[user_id]
+
+        # Уже есть запрос в полёте — ждём его, а не шлём второй
+        fut = self._inflight.get(user_id)
+        if fut is not None:
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = fut
+        try:
+            value = await self.fetch(user_id)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            # исключение уже передано ожидающим, своё «забираем», чтобы не было warning
+            fut.exception()
+            raise
+        else:
+            self.put(user_id, value)
+            fut.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(user_id, None)
+
+    def put(self, user_id: int, value: bool) -> None:
+        ttl = self.ttl_positive if value else self.ttl_negative
+        self._entries[user_id] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+from aiogram.dispatcher.middlewares.base import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import CallbackQuery, Message
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ThrottleStats:
+    processed: int = 0
+    # Повторные нажатия той же кнопки, на которые ответили без запуска хендлера
+    coalesced: int = 0
+    # Апдейты, которым пришлось ждать, пока обработается предыдущий апдейт того же чата
+    waited: int = 0
+
+
+class ThrottleMiddleware(BaseMiddleware):
+    """
+    Обработка апдейтов одного чата строго по очереди + схлопывание повторных нажатий.
+    - пока идёт обработка апдейта чата, следующие апдейты этого чата ждут;
+    - повтор кнопки (тот же chat_id и callback_data) во время обработки или в течение
+      window секунд после неё не запускает хендлер: сразу отвечаем на callback, чтобы
+      у пользователя погасли «часики», и больше ничего не делаем.
+    Подключается как outer middleware — раньше проверки подписки и FSM.
+    """
+
+    def __init__(self, window: float = 1.0, max_keys: int = 100_000):
+        self.window = window
+        self.max_keys = max_keys
+        self.stats = ThrottleStats()
+
+        # chat_id -> [lock, сколько апдейтов его держат/ждут]; удаляется, когда никому не нужен
+        self._locks: Dict[int, list] = {}
+        self._inflight: Set[Tuple[int, str]] = set()
+        # (chat_id, callback_data) -> когда обработка закончилась
+        self._recent: "OrderedDict[Tuple[int, str], float]" = OrderedDict()
+
+    @staticmethod
+    def _chat_id(event) -> Optional[int]:
+        if isinstance(event, Message):
+            return event.chat.id
+        if isinstance(event, CallbackQuery):
+            if event.message is not None:
+                return event.message.chat.id
+            return event.from_user.id
+        return None
+
+    def _is_duplicate(self, key: Tuple[int, str], now: float) -> bool:
+        if key in self._inflight:
+            return True
+        done_at = self._recent.get(key)
+        return done_at is not None and now - done_at < self.window
+
+    def _remember(self, key: Tuple[int, str]) -> None:
+        now = time.monotonic()
+        self._recent[key] = now
+        self._recent.move_to_end(key)
+        # Старые записи в начале: чистим по времени и по размеру
+        while self._recent:
+            oldest_key, done_at = next(iter(self._recent.items()))
+            if now - done_at < self.window and len(self._recent) <= self.max_keys:
+                break
+            self._recent.popitem(last=False)
+
+    async def __call__(self, handler, event, data):
+        chat_id = self._chat_id(event)
+        if chat_id is None:
+            return await handler(event, data)
+
+        key = None
+        if isinstance(event, CallbackQuery) and event.data and self.window > 0:
+            key = (chat_id, event.data)
+            if self._is_duplicate(key, time.monotonic()):
+                self.stats.coalesced += 1
+                try:
+                    await event.answer()
+                except TelegramAPIError:
+                    pass  # callback уже устарел — отвечать не обязательно
+                return None
+            self._inflight.add(key)
+
+        entry = self._locks.get(chat_id)
+        if entry is None:
+            entry = self._locks[chat_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        lock = entry[0]
+        if lock.locked():
+            self.stats.waited += 1
+        try:
+            async with lock:
+                self.stats.processed += 1
+                return await handler(event, data)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[chat_id]
+            if key is not None:
+                self._inflight.discard(key)
+                self._remember(key)
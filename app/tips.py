@@ -0,0 +1,44 @@
+from typing import Mapping, Optional, Tuple
+
+from .logic import TIP_SEGMENTS, content_bundle, segment_values
+
+# Каталог для подписчиков без ответов квиза (tips_segment IS NULL)
+GENERAL_SEGMENT = TIP_SEGMENTS
+
+
+def _matches(tags: Mapping[str, frozenset], values: Mapping[str, str]) -> bool:
+    return all(values[name] in allowed for name, allowed in tags.items())
+
+
+# ===== Precomputed catalogs =====
+# Сегментов немного (TIP_SEGMENTS), поэтому каталог советов для каждого собирается один раз:
+# при рассылке совет берётся по (сегмент, tips_index) без разбора тегов на каждого получателя.
+# Каталоги помнят версию бандла контента и пересобираются после его перезагрузки.
+_CATALOGS: Optional[Tuple[int, Tuple[Tuple[str, ...], ...]]] = None
+
+
+def build_tip_catalogs() -> Tuple[Tuple[str, ...], ...]:
+    """Индекс — сегмент (последний — GENERAL_SEGMENT): свои советы сегмента, затем общие."""
+    global _CATALOGS
+    bundle = content_bundle()
+    if _CATALOGS is None or _CATALOGS[0] != bundle.version:
+        general = bundle.daily_tips
+        catalogs = []
+        for segment in range(TIP_SEGMENTS):
+            values = segment_values(segment)
+            own = tuple(text for tags, text in bundle.segment_tips if _matches(tags, values))
+            catalogs.append(own + general)
+        catalogs.append(general)
+        _CATALOGS = (bundle.version, tuple(catalogs))
+    return _CATALOGS[1]
+
+
+def tip_catalog(
+    segment: Optional[int], catalogs: Optional[Tuple[Tuple[str, ...], ...]] = None
+) -> Tuple[str, ...]:
+    """catalogs — снимок build_tip_catalogs(), чтобы рассылка целиком шла по одной версии."""
+    if catalogs is None:
+        catalogs = build_tip_catalogs()
+    if segment is None or not 0 <= segment < TIP_SEGMENTS:
+        return catalogs[GENERAL_SEGMENT]
+    return catalogs[segment]
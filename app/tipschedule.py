@@ -0,0 +1,90 @@
+from datetime import datetime, time as dtime, timedelta
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+MINUTES_PER_DAY = 24 * 60
+
+
+@lru_cache(maxsize=1024)
+def zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def valid_zone(name: str) -> bool:
+    try:
+        zone(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def parse_hhmm(value: str) -> Optional[int]:
+    """«09:30» → минута суток (570); None, если формат неверный."""
+    hours, sep, minutes = value.partition(":")
+    if not sep or not hours.isdigit() or not minutes.isdigit():
+        return None
+    h, m = int(hours), int(minutes)
+    if h > 23 or m > 59:
+        return None
+    return h * 60 + m
+
+
+def parse_tz_args(args: Sequence[str]) -> Optional[Tuple[str, Optional[int]]]:
+    """
+    Аргументы /tz: «Zone [HH:MM]» → (пояс, минута суток или None, если время не указано).
+    None — пояс неизвестен, время в неверном формате или лишние аргументы.
+    """
+    if not 1 <= len(args) <= 2 or not valid_zone(args[0]):
+        return None
+    if len(args) == 1:
+        return args[0], None
+    minute = parse_hhmm(args[1])
+    if minute is None:
+        return None
+    return args[0], minute
+
+
+def format_minute(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def next_local_minute(now_minute: int, tz: ZoneInfo, minute: int) -> int:
+    """Ближайший момент строго после now_minute (UTC, в минутах от эпохи), когда в tz наступает minute."""
+    day = datetime.fromtimestamp(now_minute * 60, tz).date()
+    local = dtime(minute // 60, minute % 60)
+    while True:
+        at = int(datetime.combine(day, local, tzinfo=tz).timestamp() // 60)
+        if at > now_minute:
+            return at
+        day += timedelta(days=1)
+
+
+class TipSchedule:
+    """
+    Время доставки совета для пользователя.
+    Пользователь может задать свой часовой пояс и время (/tz); если не задал — пояс бота
+    и время из окна [base_minute, base_minute + window): место в окне выбирается по chat_id,
+    так что рассылка равномерно размазана по окну, а не бьёт всех в одну минуту.
+    """
+
+    def __init__(self, default_tz: str, base_minute: int, window: int = 120):
+        self.default_tz = default_tz
+        self.base_minute = base_minute
+        self.window = max(window, 1)
+
+    def default_minute(self, chat_id: int) -> int:
+        # Мультипликативный хеш Кнута: соседние chat_id разлетаются по всему окну
+        offset = ((chat_id * 2654435761) & 0xFFFFFFFF) % self.window
+        return (self.base_minute + offset) % MINUTES_PER_DAY
+
+    def minute_for(self, chat_id: int, minute: Optional[int]) -> int:
+        return minute if minute is not None else self.default_minute(chat_id)
+
+    def zone_for(self, tz: Optional[str]) -> ZoneInfo:
+        if tz and valid_zone(tz):
+            return zone(tz)
+        return zone(self.default_tz)
+
+    def next_at(self, now_minute: int, chat_id: int, tz: Optional[str], minute: Optional[int]) -> int:
+        return next_local_minute(now_minute, self.zone_for(tz), self.minute_for(chat_id, minute))
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import signal
+from collections import deque
+from typing import Deque, Dict, Optional, Set
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def update_chat_id(update: Update) -> Optional[int]:
+    """chat_id апдейта (для маршрутизации), либо id пользователя, если чата нет."""
+    try:
+        event = update.event
+    except Exception:  # неизвестный тип апдейта
+        return None
+    chat = getattr(event, "chat", None)
+    if chat is None:
+        message = getattr(event, "message", None)
+        chat = getattr(message, "chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, "from_user", None)
+    return user.id if user is not None else None
+
+
+class UpdateQueue:
+    """
+    Приём апдейтов перед диспетчером. Апдейты одного чата обрабатываются строго по очереди
+    (цепочка на chat_id), разные чаты — параллельными задачами; одновременно работающих
+    хендлеров не больше concurrency. Хендлеры в основном ждут сеть и лимитеры, поэтому
+    concurrency — сотни, а не число ядер. Принятых, но не обработанных апдейтов —
+    не больше queue_size.
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, queue_size: int = 1000, concurrency: int = 256):
+        self.dp = dp
+        self.bot = bot
+        self.queue_size = queue_size
+        self._slots = asyncio.Semaphore(concurrency)
+        # chat_id -> апдейты, ждущие своей очереди; есть ключ — по чату уже идёт цепочка
+        self._chats: Dict[Optional[int], Deque[Update]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._pending = 0
+        self._space = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._accepting = False
+
+    def _accept(self, update: Update) -> None:
+        self._pending += 1
+        self._idle.clear()
+        chat_id = update_chat_id(update)
+        chain = self._chats.get(chat_id) if chat_id is not None else None
+        if chain is not None:
+            chain.append(update)
+            return
+        chain = deque((update,))
+        if chat_id is not None:
+            self._chats[chat_id] = chain
+        task = asyncio.create_task(self._run_chain(chat_id, chain))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def offer(self, update: Update) -> bool:
+        """Без ожидания; False — очередь переполнена или остановлена."""
+        if not self._accepting or self._pending >= self.queue_size:
+            return False
+        self._accept(update)
+        return True
+
+    async def submit(self, update: Update) -> None:
+        """С ожиданием свободного места (backpressure для источника)."""
+        while self._pending >= self.queue_size:
+            self._space.clear()
+            await self._space.wait()
+        self._accept(update)
+
+    async def _run_chain(self, chat_id: Optional[int], chain: "Deque[Update]") -> None:
+        try:
+            while chain:
+                update = chain[0]
+                try:
+                    async with self._slots:
+                        await self.dp.feed_update(self.bot, update)
+                except Exception:
+                    logger.exception("Failed to process update %s", update.update_id)
+                finally:
+                    chain.popleft()
+                    self._pending -= 1
+                    self._space.set()
+                    if self._pending == 0:
+                        self._idle.set()
+        finally:
+            if chat_id is not None and self._chats.get(chat_id) is chain:
+                del self._chats[chat_id]
+
+    def start(self) -> None:
+        self._accepting = True
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        self._accepting = False
+        # Даём дообработать то, что уже принято
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%d updates not processed in %.0fs", self._pending, timeout)
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._chats.clear()
+
+
+class WebhookServer:
+    """
+    Приём апдейтов по webhook.
+    Обработчик HTTP только валидирует апдейт и кладёт его в UpdateQueue, сразу отвечая
+    Telegram 200. Если очередь переполнена, отвечаем 503: Telegram повторит доставку позже
+    (backpressure).
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        path: str = "/webhook",
+        secret: str = "",
+        queue_size: int = 1000,
+        concurrency: int = 256,
+    ):
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.updates = UpdateQueue(dp, bot, queue_size=queue_size, concurrency=concurrency)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            logger.warning("Malformed webhook update", exc_info=True)
+            return web.Response(status=400)
+        if not self.updates.offer(update):
+            return web.Response(status=503)
+        return web.Response()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+
+async def wait_for_stop_signal() -> None:
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    await stop.wait()
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    url: str,
+    host: str,
+    port: int,
+    path: str = "/webhook",
+    secret: str = "",
+    queue_size: int = 1000,
+    concurrency: int = 256,
+) -> None:
+    server = WebhookServer(
+        dp, bot, path=path, secret=secret, queue_size=queue_size, concurrency=concurrency
+    )
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    server.updates.start()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        await bot.set_webhook(
+            url.rstrip("/") + path,
+            secret_token=secret or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logger.info("Webhook listening on %s:%d%s", host, port, path)
+        await wait_for_stop_signal()
+    finally:
+        await runner.cleanup()
+        await server.updates.stop()
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
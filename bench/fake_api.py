@@ -0,0 +1,182 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов.
+
+Реализует то, что нужно боту: getMe, getUpdates (long polling), sendMessage,
+answerCallbackQuery, getChatMember, deleteWebhook; остальные методы отвечают ok/true.
+Задержка ответа и доля ответов 429 (RetryAfter) настраиваются.
+
+Отдельно:  python -m bench.fake_api --port 8081 --latency-ms 20 --error-rate 0.01
+Бот:       BOT_API_URL=http://127.0.0.1:8081 BOT_TOKEN=1:TEST python -m app.main
+Апдейты подкладываются через POST /_fake/updates (JSON-апдейт или список апдейтов),
+счётчики — GET /_fake/stats. Из Python удобнее пользоваться FakeBotAPI напрямую (см. loadtest.py).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake bot", "username": "fake_bot"}
+
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+
+        self._next_update_id = 1
+        self._updates: Deque[Dict[str, Any]] = deque()
+        self._has_updates = asyncio.Event()
+        self._next_message_id = 1
+        # chat_id -> очередь сообщений, отправленных ботом в этот чат
+        self._outbox: Dict[int, "asyncio.Queue[Dict[str, Any]]"] = defaultdict(asyncio.Queue)
+
+        self.calls: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self.polled = asyncio.Event()
+
+    # ----- со стороны теста -----
+
+    def push_update(self, update: Dict[str, Any]) -> int:
+        update = dict(update)
+        update["update_id"] = self._next_update_id
+        self._next_update_id += 1
+        self._updates.append(update)
+        self._has_updates.set()
+        return update["update_id"]
+
+    async def next_message(self, chat_id: int, timeout: float = 30.0) -> Dict[str, Any]:
+        return await asyncio.wait_for(self._outbox[chat_id].get(), timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": dict(self.calls),
+            "rate_limited": dict(self.rate_limited),
+            "pending_updates": len(self._updates),
+        }
+
+    # ----- Bot API -----
+
+    async def get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self.polled.set()
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        if not self._updates and timeout > 0:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(self._has_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return [u for _, u in zip(range(limit), self._updates)]
+
+    def send_message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = int(params["chat_id"])
+        message = {
+            "message_id": self._next_message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        self._next_message_id += 1
+        if params.get("reply_markup"):
+            markup = params["reply_markup"]
+            message["reply_markup"] = json.loads(markup) if isinstance(markup, str) else markup
+        self._outbox[chat_id].put_nowait(message)
+        return message
+
+    async def call(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return {"ok": True, "result": await self.get_updates(params)}
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.rate_limited[method] += 1
+            return {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+
+        if method == "getMe":
+            result: Any = BOT_USER
+        elif method == "sendMessage":
+            result = self.send_message(params)
+        elif method == "getChatMember":
+            user_id = int(params["user_id"])
+            result = {
+                "status": "member",
+                "user": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            }
+        else:  # deleteWebhook, answerCallbackQuery, ...
+            result = True
+        return {"ok": True, "result": result}
+
+    # ----- HTTP -----
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        return web.json_response(await self.call(request.match_info["method"], params))
+
+    async def handle_push(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        ids = [self.push_update(u) for u in (data if isinstance(data, list) else [data])]
+        return web.json_response({"ok": True, "result": ids})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/bot{token}/{method}", self.handle)
+        app.router.add_post("/_fake/updates", self.handle_push)
+        app.router.add_get("/_fake/stats", self.handle_stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay before each answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 429 answers (0..1)")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after in injected 429s")
+    return parser.parse_args(argv)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    api = FakeBotAPI(args.latency_ms / 1000, args.error_rate, args.retry_after)
+    runner = await api.start(args.host, args.port)
+    print(f"Fake Bot API on http://{args.host}:{args.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
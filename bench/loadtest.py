@@ -0,0 +1,239 @@
+"""
+Нагрузочный тест бота целиком, без настоящего Telegram.
+
+Поднимает bench/fake_api.py, запускает бота (`python -m app.main`, код бота не меняется —
+только BOT_API_URL и временная БД) и прогоняет N пользователей по полному сценарию:
+/start → «Начать» → все шаги квиза → результат → «Подробнее» → «Сохранить».
+Кнопки берутся из клавиатуры последнего ответа бота, так что подходит и QUIZ_MODE=stateless.
+
+Задержка шага — от появления апдейта в getUpdates до ответа бота в этот чат.
+В конце печатает p50/p99 по шагам и апдейты в секунду.
+
+    python -m bench.loadtest --users 2000 --concurrency 300
+    python -m bench.loadtest --users 500 --latency-ms 30 --error-rate 0.02 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from .fake_api import BOT_USER, FakeBotAPI
+
+USER_ID_BASE = 10_000_000
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def callback_buttons(message: Dict[str, Any]) -> List[str]:
+    rows = (message.get("reply_markup") or {}).get("inline_keyboard") or []
+    return [b["callback_data"] for row in rows for b in row if b.get("callback_data")]
+
+
+class LoadTest:
+    def __init__(self, api: FakeBotAPI, step_timeout: float = 30.0):
+        self.api = api
+        self.step_timeout = step_timeout
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.updates = 0
+
+    @staticmethod
+    def _user(user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def _text_update(self, user_id: int, text: str) -> Dict[str, Any]:
+        return {
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": self._user(user_id),
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+            }
+        }
+
+    def _callback_update(self, user_id: int, message: Dict[str, Any], data: str) -> Dict[str, Any]:
+        return {
+            "callback_query": {
+                "id": f"{user_id}:{time.monotonic_ns()}",
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": message["message_id"],
+                    "date": message["date"],
+                    "chat": message["chat"],
+                    "from": BOT_USER,
+                    "text": message.get("text", ""),
+                },
+            }
+        }
+
+    async def _step(self, name: str, user_id: int, update: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self.api.push_update(update)
+        self.updates += 1
+        try:
+            reply = await self.api.next_message(user_id, self.step_timeout)
+        except asyncio.TimeoutError:
+            self.errors[name] += 1
+            raise
+        self.latencies[name].append(time.perf_counter() - started)
+        return reply
+
+    async def run_user(self, user_id: int) -> None:
+        try:
+            reply = await self._step("start", user_id, self._text_update(user_id, "/start"))
+            while True:
+                buttons = callback_buttons(reply)
+                if "detail" in buttons:
+                    break
+                if not buttons:
+                    self.errors["no_keyboard"] += 1
+                    return
+                step = "start_quiz" if "start_quiz" in buttons else "quiz"
+                data = "start_quiz" if step == "start_quiz" else random.choice(buttons)
+                reply = await self._step(step, user_id, self._callback_update(user_id, reply, data))
+            result = reply
+            await self._step("detail", user_id, self._callback_update(user_id, result, "detail"))
+            save = next(b for b in callback_buttons(result) if b.startswith("save"))
+            await self._step("save", user_id, self._callback_update(user_id, result, save))
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self, users: int, concurrency: int) -> float:
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(i: int) -> None:
+            async with sem:
+                await self.run_user(USER_ID_BASE + i)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(users)))
+        return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        steps = {
+            name: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2),
+            }
+            for name, values in self.latencies.items()
+        }
+        everything = [v for values in self.latencies.values() for v in values]
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "updates": self.updates,
+            "updates_per_s": round(self.updates / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(everything, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(everything, 0.99) * 1000, 2),
+            "steps": steps,
+            "errors": dict(self.errors),
+            "api": self.api.stats(),
+        }
+
+
+def bot_env(args: argparse.Namespace, api_url: str, workdir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        BOT_TOKEN="123456:LOADTEST",
+        BOT_API_URL=api_url,
+        BOT_MODE="polling",
+        DB_PATH=os.path.join(workdir, "loadtest.sqlite3"),
+        WORKERS=str(args.workers),
+        QUIZ_MODE=args.quiz_mode,
+    )
+    if not args.keep_limits:
+        # Локальный API не ограничивает частоту — меряем сам бот, а не лимиты Telegram
+        env.update(OUTBOUND_RATE="1000000", OUTBOUND_CHAT_RATE="1000", OUTBOUND_CHAT_BURST="100")
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"\n{report['updates']} updates in {report['elapsed_s']:.1f}s → "
+        f"{report['updates_per_s']:.1f} updates/s, "
+        f"p50 {report['p50_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms"
+    )
+    print(f"{'step':<12}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, s in report["steps"].items():
+        print(f"{name:<12}{s['count']:>8}{s['p50_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    if report["errors"]:
+        print("errors:", report["errors"])
+    print("api calls:", report["api"]["calls"])
+    if report["api"]["rate_limited"]:
+        print("injected 429:", report["api"]["rate_limited"])
+
+
+async def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description="End-to-end load test against a fake Bot API")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="users running at once")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fake API answer delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of injected 429s")
+    parser.add_argument("--step-timeout", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=1, help="WORKERS for the bot")
+    parser.add_argument("--quiz-mode", default="fsm", choices=("fsm", "stateless"))
+    parser.add_argument("--keep-limits", action="store_true", help="keep production OUTBOUND_* limits")
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the bot")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+
+    api = FakeBotAPI(args.latency_ms / 1000, args.error_rate)
+    runner = await api.start("127.0.0.1", args.port)
+    workdir = tempfile.mkdtemp(prefix="bot-loadtest-")
+    log_path = os.path.join(workdir, "bot.log")
+    with open(log_path, "wb") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "app.main"],
+            env=bot_env(args, f"http://127.0.0.1:{args.port}", workdir),
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    try:
+        try:
+            await asyncio.wait_for(api.polled.wait(), 120)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Bot did not start polling, see {log_path}") from None
+
+        test = LoadTest(api, step_timeout=args.step_timeout)
+        elapsed = await test.run(args.users, args.concurrency)
+        report = test.report(elapsed)
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, proc.wait, 30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        await runner.cleanup()
+
+    print_report(report)
+    print(f"bot log: {log_path}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
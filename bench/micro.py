@@ -0,0 +1,409 @@
+"""
+Микробенчмарки горячих путей: logic/content, все методы DB на таблицах реального размера
+и ежедневная рассылка (send_daily_tips) против заглушки бота.
+
+    python -m bench.micro                                  # 10k и 100k пользователей
+    python -m bench.micro --sizes 10000,100000,1000000 --save baseline.json
+    python -m bench.micro --compare baseline.json          # exit 1, если есть регрессии
+    python -m bench.micro --filter db.get_                 # только подходящие бенчмарки
+
+Для каждого бенчмарка — медиана и минимум времени одной операции по нескольким раундам.
+"""
+import argparse
+import asyncio
+import dataclasses
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault("BOT_TOKEN", "0:BENCH")
+
+from app.config import get_settings  # noqa: E402
+from app.db import RECIPIENT_SENT, AsyncDB, DB, DBProfile  # noqa: E402
+from app.logic import (  # noqa: E402
+    ANSWERS_SPACE,
+    build_text,
+    build_text_table,
+    content_bundle,
+    decode_answers,
+    encode_answers,
+    image_links_for_set,
+    pick_photo_set,
+    render_text,
+    tip_segment_of_code,
+)
+from app.tips import tip_catalog  # noqa: E402
+
+DEFAULT_SIZES = (10_000, 100_000)
+# Доля пользователей с включёнными советами
+TIPS_SHARE = 0.3
+
+
+# ================= Harness =================
+
+def measure(fn: Callable[[], Any], rounds: int = 5, min_round: float = 0.05, number: int = 0) -> Dict[str, Any]:
+    """
+    Время одной операции fn(): number вызовов на раунд (0 — подобрать так, чтобы раунд
+    длился не меньше min_round), rounds раундов, GC на время замеров выключен.
+    """
+    if not number:
+        number = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - started >= min_round or number >= 1 << 20:
+                break
+            number *= 2
+
+    per_op: List[float] = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter_ns()
+            for _ in range(number):
+                fn()
+            per_op.append((time.perf_counter_ns() - started) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        "median_ns": statistics.median(per_op),
+        "min_ns": min(per_op),
+        "number": number,
+        "rounds": rounds,
+    }
+
+
+class Suite:
+    def __init__(self, pattern: str = ""):
+        self.pattern = pattern
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def wanted(self, name: str) -> bool:
+        return self.pattern in name
+
+    def run(self, name: str, fn: Callable[[], Any], **options) -> None:
+        if not self.wanted(name):
+            return
+        result = measure(fn, **options)
+        self.results[name] = result
+        print(f"{name:<60}{format_ns(result['median_ns']):>12}{format_ns(result['min_ns']):>12}")
+
+    def record(self, name: str, seconds: float, **extra) -> None:
+        """Для разовых «тяжёлых» замеров (рассылка целиком)."""
+        self.results[name] = {"median_ns": seconds * 1e9, "min_ns": seconds * 1e9, "rounds": 1, **extra}
+        print(f"{name:<60}{format_ns(seconds * 1e9):>12}{'':>12}  {extra}")
+
+
+def format_ns(ns: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("µs", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.0f} ns"
+
+
+# ================= logic / content =================
+
+def bench_logic(suite: Suite) -> None:
+    build_text_table()
+    codes = list(range(ANSWERS_SPACE))
+    random.Random(1).shuffle(codes)
+    answers = [decode_answers(code) for code in codes]
+    next_answers = itertools.cycle(answers).__next__
+    next_code = itertools.cycle(codes).__next__
+    set_ids = itertools.cycle(sorted({pick_photo_set(a) for a in answers})).__next__
+
+    suite.run("logic.build_text[short]", lambda: build_text(next_answers(), "short"))
+    suite.run("logic.build_text[full]", lambda: build_text(next_answers(), "full"))
+    suite.run("logic.render_text[short] (uncached)", lambda: render_text(next_answers(), "short"))
+    suite.run("logic.render_text[full] (uncached)", lambda: render_text(next_answers(), "full"))
+    suite.run("logic.pick_photo_set", lambda: pick_photo_set(next_answers()))
+    suite.run("logic.encode_answers", lambda: encode_answers(next_answers()))
+    suite.run("logic.decode_answers", lambda: decode_answers(next_code()))
+    suite.run("content.image_links_for_set", lambda: image_links_for_set(set_ids()))
+    suite.run("tips.tip_catalog", lambda: tip_catalog(tip_segment_of_code(next_code())))
+
+
+# ================= DB =================
+
+def populate(path: str, size: int, seed: int = 1) -> None:
+    """
+    Таблица users на size пользователей + сохранённые планы и FSM-записи части из них,
+    а также локальная таблица подписчиков канала на всех.
+    """
+    rnd = random.Random(seed)
+    db = DB(path)
+    db.init(DBProfile())
+    with db.conn:
+        db.conn.executemany(
+            "INSERT INTO users(chat_id, tips_enabled, tips_index, next_tip_at, last_answers_code, "
+            "tips_segment, saved_answers_code, saved_level, saved_version) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);",
+            (
+                (
+                    chat_id,
+                    1 if rnd.random() < TIPS_SHARE else 0,
+                    rnd.randrange(len(content_bundle().daily_tips)),
+                    0,  # время совета уже наступило — рассылка возьмёт всех подписанных
+                    code,
+                    tip_segment_of_code(code),
+                    *((rnd.randrange(ANSWERS_SPACE), 0, 1) if rnd.random() < 0.2 else (None, None, None)),
+                )
+                for chat_id, code in ((i, rnd.randrange(ANSWERS_SPACE)) for i in range(1, size + 1))
+            ),
+        )
+        now = time.time()
+        db.conn.executemany(
+            "INSERT INTO fsm_states(key, state, data, updated_at) VALUES (?, ?, ?, ?);",
+            (
+                (f"1:{chat_id}:{chat_id}:::default", "Quiz:tone", '{"skin": "dry"}', now - rnd.random() * 172800)
+                for chat_id in range(1, size + 1, 10)
+            ),
+        )
+        db.conn.executemany(
+            "INSERT INTO channel_members(user_id, is_member, checked_at) VALUES (?, ?, ?);",
+            (
+                (user_id, 1 if rnd.random() < 0.9 else 0, now - rnd.random() * 172800)
+                for user_id in range(1, size + 1)
+            ),
+        )
+    db.close()
+
+
+def id_cycle(size: int, seed: int = 2) -> Callable[[], int]:
+    rnd = random.Random(seed)
+    return itertools.cycle([rnd.randint(1, size) for _ in range(4096)]).__next__
+
+
+def bench_db(suite: Suite, size: int, workdir: str) -> None:
+    path = os.path.join(workdir, f"users_{size}.sqlite3")
+    started = time.perf_counter()
+    populate(path, size)
+    print(f"-- DB with {size} users ready in {time.perf_counter() - started:.1f}s")
+
+    tag = f"[n={size}]"
+    db = DB(path)
+    db.init(DBProfile())
+    existing = id_cycle(size)
+    fresh = itertools.count(size + 1).__next__
+    codes = itertools.cycle(range(ANSWERS_SPACE)).__next__
+    fsm_keys = itertools.cycle([f"1:{i}:{i}:::default" for i in range(1, size + 1, 10)][:4096]).__next__
+
+    suite.run(f"db.init(reopen){tag}", lambda: DB(path).init(DBProfile()), number=1)
+    suite.run(f"db.ensure_user(existing){tag}", lambda: db.ensure_user(existing()))
+    suite.run(f"db.ensure_user(new){tag}", lambda: db.ensure_user(fresh()))
+    suite.run(f"db.get_all_chat_ids{tag}", db.get_all_chat_ids, number=1)
+    suite.run(f"db.set_tips{tag}", lambda: db.set_tips(existing(), True))
+    suite.run(f"db.get_tips_enabled{tag}", lambda: db.get_tips_enabled(existing()))
+    suite.run(f"db.get_all_tips_enabled_users{tag}", db.get_all_tips_enabled_users, number=1)
+    suite.run(f"db.advance_tip_index{tag}", lambda: db.advance_tip_index(existing(), 3))
+    suite.run(f"db.save_last_result{tag}", lambda: db.save_last_result(existing(), "💾 plan text " * 40))
+    suite.run(f"db.get_last_result{tag}", lambda: db.get_last_result(existing()))
+    suite.run(f"db.save_plan{tag}", lambda: db.save_plan(existing(), codes(), 0, 1))
+    suite.run(f"db.get_saved_plan{tag}", lambda: db.get_saved_plan(existing()))
+    suite.run(f"db.save_last_answers{tag}", lambda: db.save_last_answers(existing(), codes()))
+    suite.run(f"db.get_last_answers{tag}", lambda: db.get_last_answers(existing()))
+    suite.run(f"db.load_fsm{tag}", lambda: db.load_fsm(fsm_keys()))
+    suite.run(
+        f"db.save_fsm(100 rows){tag}",
+        lambda: db.save_fsm([(fsm_keys(), "Quiz:eyes", '{"skin": "oily"}', time.time()) for _ in range(100)]),
+    )
+    suite.run(
+        f"db.apply_batch(500 users){tag}",
+        lambda: db.apply_batch({existing(): {"last_answers_code": codes()} for _ in range(500)}),
+    )
+    # purge удаляет записи — каждый раунд режет по своей (всё более поздней) границе
+    cutoffs = itertools.count(int(time.time()) - 172800, 3600).__next__
+    suite.run(f"db.purge_fsm{tag}", lambda: db.purge_fsm(cutoffs()), number=1)
+
+    zones = itertools.cycle(["Europe/Moscow", "Asia/Almaty", None]).__next__
+    suite.run(f"db.set_tips_time{tag}", lambda: db.set_tips_time(existing(), zones(), 540))
+    suite.run(f"db.get_tips_time{tag}", lambda: db.get_tips_time(existing()))
+    # Расписание: reschedule=None оставляет next_tip_at пустым — каждый вызов делает ту же работу
+    with db.conn:
+        db.conn.execute("UPDATE users SET next_tip_at=NULL WHERE chat_id % 10 = 0;")
+    suite.run(f"db.schedule_tips(1000){tag}", lambda: db.schedule_tips(0, lambda *_: None, limit=1000))
+    with db.conn:
+        db.conn.execute("UPDATE users SET next_tip_at=0 WHERE next_tip_at IS NULL;")
+    # Все подписанные уже ждут совета (next_tip_at=0); reschedule оставляет их «должными»,
+    # так что каждый вызов создаёт задание на всех
+    now_minute = int(time.time() // 60)
+    claims = (f"bench:claim:{i}" for i in itertools.count())
+    suite.run(
+        f"db.claim_due_tips{tag}",
+        lambda: db.claim_due_tips(next(claims), now_minute, lambda now, *_: 0),
+        number=1,
+        rounds=3,
+    )
+
+    # Задание рассылки для остальных бенчмарков
+    job_id = db.claim_due_tips("bench", now_minute, lambda now, *_: now + 1440)
+    suite.run(f"db.get_unfinished_broadcast_jobs{tag}", db.get_unfinished_broadcast_jobs)
+    after = itertools.cycle([None] + [r[0] for r in db.get_broadcast_chunk(job_id, None, 4096)][::64]).__next__
+    suite.run(f"db.get_broadcast_chunk(1000){tag}", lambda: db.get_broadcast_chunk(job_id, after(), 1000))
+    chunk = db.get_broadcast_chunk(job_id, None, 100)
+    results = [(chat_id, RECIPIENT_SENT, (idx + 1) % len(content_bundle().daily_tips)) for chat_id, idx, _ in chunk]
+    suite.run(f"db.mark_broadcast_results(100){tag}", lambda: db.mark_broadcast_results(job_id, results))
+    suite.run(f"db.finish_broadcast_job{tag}", lambda: db.finish_broadcast_job(job_id))
+
+    suite.run(f"db.get_channel_member{tag}", lambda: db.get_channel_member(existing()))
+    suite.run(
+        f"db.set_channel_members(100 rows){tag}",
+        lambda: db.set_channel_members([(existing(), True, time.time()) for _ in range(100)]),
+    )
+    suite.run(
+        f"db.get_stale_channel_members(100){tag}",
+        lambda: db.get_stale_channel_members(time.time() - 86400, 100),
+    )
+    db.close()
+
+    asyncio.run(bench_async_db(suite, path, tag, existing, codes))
+
+
+async def bench_async_db(suite: Suite, path: str, tag: str, existing, codes) -> None:
+    """Те же операции через AsyncDB (поток-писатель + write-behind), как их видят хендлеры."""
+    if not any(suite.wanted(f"asyncdb.{name}{tag}") for name in ("get_last_answers", "save_last_answers")):
+        return
+    db = AsyncDB(path, profile=DBProfile(), durability="batched")
+    await db.init()
+
+    async def timed(name: str, make: Callable[[], Any], number: int = 2000) -> None:
+        if not suite.wanted(name):
+            return
+        per_op = []
+        for _ in range(5):
+            started = time.perf_counter_ns()
+            for _ in range(number):
+                await make()
+            per_op.append((time.perf_counter_ns() - started) / number)
+        suite.results[name] = {"median_ns": statistics.median(per_op), "min_ns": min(per_op), "number": number, "rounds": 5}
+        print(f"{name:<60}{format_ns(statistics.median(per_op)):>12}{format_ns(min(per_op)):>12}")
+
+    await timed(f"asyncdb.get_last_answers{tag}", lambda: db.get_last_answers(existing()))
+    await timed(f"asyncdb.save_last_answers{tag}", lambda: db.save_last_answers(existing(), codes()))
+    await db.close()
+
+
+# ================= Broadcast =================
+
+class StubBot:
+    """Заглушка Bot: send_message ничего не шлёт, только отдаёт управление циклу."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        self.sent += 1
+        await asyncio.sleep(0)
+
+
+def bench_broadcast(suite: Suite, size: int, workdir: str) -> None:
+    name = f"broadcast.send_daily_tips[n={size}]"
+    if not suite.wanted(name):
+        return
+    from app.main import send_daily_tips
+
+    path = os.path.join(workdir, f"broadcast_{size}.sqlite3")
+    populate(path, size)
+    settings = dataclasses.replace(
+        get_settings(), broadcast_rate=1e9, outbound_rate=1e9, broadcast_concurrency=100
+    )
+
+    async def run() -> Tuple[float, int]:
+        db = AsyncDB(path, profile=DBProfile(), durability="batched")
+        await db.init()
+        bot = StubBot()
+        started = time.perf_counter()
+        await send_daily_tips(bot, db, settings)
+        elapsed = time.perf_counter() - started
+        await db.close()
+        return elapsed, bot.sent
+
+    elapsed, sent = asyncio.run(run())
+    suite.record(name, elapsed, sent=sent, msg_per_s=round(sent / elapsed, 1) if elapsed else 0.0)
+
+
+# ================= Compare =================
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> int:
+    """Печатает сравнение с базой, возвращает число регрессий (медиана хуже на threshold)."""
+    regressions = 0
+    print(f"\n{'benchmark':<60}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        ratio = result["median_ns"] / base["median_ns"] if base["median_ns"] else 1.0
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(
+            f"{name:<60}{format_ns(base['median_ns']):>12}{format_ns(result['median_ns']):>12}"
+            f"{(ratio - 1) * 100:>+9.1f}%{flag}"
+        )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for logic, content, DB and broadcast")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="users table sizes")
+    parser.add_argument("--filter", default="", help="run only benchmarks whose name contains this")
+    parser.add_argument("--save", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%")
+    parser.add_argument("--no-broadcast", action="store_true", help="skip the send_daily_tips run")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    suite = Suite(args.filter)
+    print(f"{'benchmark':<60}{'median':>12}{'min':>12}")
+
+    bench_logic(suite)
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    try:
+        for size in sizes:
+            bench_db(suite, size, workdir)
+            if not args.no_broadcast:
+                bench_broadcast(suite, size, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": suite.results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{regressions} regression(s) over {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Логика плана до переноса правил в content.json (if-цепочки) — эталон для тестов:
+скомпилированные таблицы правил должны давать ровно те же тексты.
+При осознанной правке текстов/правил в content.json меняйте и этот файл.
+"""
+from app.logic import Answers, DetailLevel, Eyes, Skin, Undertone, image_links_for_set
+
+
+
+
+# ===== Photo sets =====
+def pick_photo_set(a: Answers) -> int:
+    # Priority: occasion → eyes → undertone → skin → base
+    if a.occasion == "date":
+        return 2
+    if a.occasion == "party":
+        return 3
+    if a.occasion == "photo":
+        return 4
+
+    if a.eyes == "hooded":
+        return 5
+    if a.eyes == "small":
+        return 6
+
+    if a.undertone == "warm":
+        return 7
+    if a.undertone == "cool":
+        return 8
+
+    if a.skin in ("oily", "combo"):
+        return 9
+    if a.skin == "dry":
+        return 10
+
+    return 1
+
+
+# ===== Summary lines =====
+def skin_line(s: Skin) -> str:
+    return {
+        "dry": "сухая → увлажнение и кремовые текстуры (сияние выглядит лучше)",
+        "normal": "нормальная → подойдут почти все текстуры, лучше лёгкие слои",
+        "combo": "комбинированная → матируем Т-зону, щёки оставляем “живыми”",
+        "oily": "жирная → тонкий слой + фиксация в Т-зоне, без “маски”",
+        "unknown": "тип не определён → универсально: лёгкий тон + точечная коррекция",
+    }[s]
+
+
+def undertone_line(u: Undertone) -> str:
+    return {
+        "warm": "тёплый → персиковые, бежевые, золотистые оттенки",
+        "cool": "холодный → розовые, ягодные, холодные бежи",
+        "unknown": "не определён → нейтральные бежево-розовые оттенки",
+    }[u]
+
+
+def palette_hint(u: Undertone) -> str:
+    return {
+        "warm": "🎨 Оттенки: персик, тёплый беж, карамель, тёплый коричневый.",
+        "cool": "🎨 Оттенки: розово-бежевый, тауп, серо-коричневый, ягодный нюд.",
+        "unknown": "🎨 Оттенки: бежево-розовый, светлый тауп, нейтральный коричневый.",
+    }[u]
+
+
+def eyes_short(e: Eyes) -> str:
+    return {
+        "small": "маленькие → свет внутри, тень только снаружи (растушёвка вверх)",
+        "big": "большие → добавляем глубину мягкой тенью, без тяжёлого низа",
+        "hooded": "навиcшее веко → тени выше складки, мягкие линии, матовые текстуры",
+        "almond": "миндалевидные → универсально: тень во внешний угол + диагональ к виску",
+    }[e]
+
+
+# ===== Detailed eyes guides =====
+def eyes_full(e: Eyes) -> str:
+    if e == "small":
+        return (
+            "## 👁 Маленькие глаза — как визуально увеличить\n\n"
+            "🎯 **Задача макияжа:** сделать глаз шире и “открыть” взгляд, не утяжеляя веко.\n\n"
+            "🗺 **Карта зон:**\n"
+            "• **Свет** — подвижное веко + внутренний угол\n"
+            "• **Полутень** — центр века\n"
+            "• **Тень** — только внешний угол\n\n"
+            "✏️ **Форма растушёвки:**\n"
+            "• начинай от внешнего уголка\n"
+            "• веди кисть **по диагонали вверх** к хвостику брови\n"
+            "• форма напоминает **V / галочку**\n"
+            "• тень **не опускай вниз**\n\n"
+            "👁 **Нижнее веко:**\n"
+            "• тень только во **внешней трети**\n"
+            "• центр и внутренний угол оставляй светлыми\n\n"
+            "🖌 **Подводка:**\n"
+            "• лучше тени/карандаш, а не чёрная стрелка\n"
+            "• линия тонкая по верхним ресницам\n"
+            "• хвостик — короткий и направлен вверх\n\n"
+            "🖤 **Тушь:**\n"
+            "• 1 слой — на все ресницы\n"
+            "• 2 слой — **только во внешнем уголке**\n"
+            "• подкручивание очень помогает\n\n"
+            "✅ **Быстрый чек:** если **центр века светлый** — глаз уже выглядит больше.\n\n"
+            "❌ **Ошибка новичка:** тёмные тени по всему веку и активный низ → глаз “сжимается”."
+        )
+
+    if e == "hooded":
+        return (
+            "## 👁 Нависшее веко — лифтинг без стрелок\n\n"
+            "🎯 **Задача макияжа:** приподнять форму глаза и сделать макияж видимым при открытом взгляде.\n\n"
+            "🗺 **Карта зон:**\n"
+            "• **Свет** — подвижное веко\n"
+            "• **Тень** — **выше** естественной складки\n"
+            "• **Внутренний угол** — маленькая точка света\n\n"
+            "✏️ **Форма растушёвки:**\n"
+            "• тень ставь **на открытом глазе** (смотри прямо)\n"
+            "• растушёвывай **вверх и наружу**\n"
+            "• форма — мягкое “крыло” (лифтинг)\n\n"
+            "🖌 **Подводка:**\n"
+            "• избегай толстых стрелок\n"
+            "• лучше **межресничка** + маленький хвостик тенями\n"
+            "• хвостик направляй вверх\n\n"
+            "👁 **Нижнее веко:**\n"
+            "• минимум: либо не трогай, либо очень мягко во внешнем углу\n\n"
+            "🖤 **Тушь:**\n"
+            "• подкручивание обязательно\n"
+            "• акцент на внешние ресницы\n\n"
+            "✅ **Быстрый чек:** тень должна быть **видна при открытом глазе**.\n\n"
+            "❌ **Ошибка новичка:** рисовать тень точно по складке — она “прячется”."
+        )
+
+    if e == "big":
+        return (
+            "## 👁 Большие глаза — глубина и баланс\n\n"
+            "🎯 **Задача макияжа:** добавить глубину и сделать образ собранным.\n\n"
+            "🗺 **Карта зон:**\n"
+            "• **Свет** — подвижное веко (не белый, а светло-бежевый)\n"
+            "• **Тень** — внешний угол\n"
+            "• **Полутень** — мягко по складке, чтобы добавить глубину\n\n"
+            "✏️ **Форма растушёвки:**\n"
+            "• растушёвка по диагонали к виску\n"
+            "• без резких границ\n\n"
+            "🖌 **Подводка:**\n"
+            "• можно тонкую линию по верхним ресницам\n"
+            "• без сильного утолщения к центру\n\n"
+            "👁 **Нижнее веко:**\n"
+            "• не затемняй по всей длине\n"
+            "• максимум — внешняя треть\n\n"
+            "🖤 **Тушь:**\n"
+            "• 1–2 слоя, без “паучьих лапок”\n\n"
+            "✅ **Быстрый чек:** если низ глаза лёгкий — макияж выглядит дороже.\n\n"
+            "❌ **Ошибка новичка:** одновременно тёмный верх + тёмный низ (утяжеляет взгляд)."
+        )
+
+    # almond
+    return (
+        "## 👁 Миндалевидные глаза — подчеркнуть форму\n\n"
+        "🎯 **Задача макияжа:** аккуратно подчеркнуть естественную форму.\n\n"
+        "🗺 **Карта зон:**\n"
+        "• **Свет** — подвижное веко\n"
+        "• **Тень** — внешний угол\n"
+        "• **Внутренний угол** — чуть-чуть света, без перебора\n\n"
+        "✏️ **Форма растушёвки:**\n"
+        "• классическая диагональ в сторону виска\n"
+        "• мягко, без чётких границ\n\n"
+        "🖌 **Подводка:**\n"
+        "• идеально — мягкая стрелка тенями\n"
+        "• хвостик повторяет направление нижнего века\n\n"
+        "👁 **Нижнее веко:**\n"
+        "• лёгкая тень во внешней трети\n\n"
+        "🖤 **Тушь:**\n"
+        "• акцент на внешние ресницы\n\n"
+        "✅ **Быстрый чек:** если форма “тянется” к виску — это тот самый эффект.\n\n"
+        "❌ **Ошибка новичка:** делать слишком много акцентов сразу."
+    )
+
+
+# ===== Face steps (detailed) =====
+def face_steps(a: Answers) -> str:
+    # конкретные инструкции по зонам лица
+    prep = "1️⃣ **Подготовка:** крем/гель. Подожди 2–3 минуты."
+    if a.skin == "oily":
+        prep = "1️⃣ **Подготовка:** лёгкий гель/крем. Подожди 2–3 минуты."
+
+    tone = "2️⃣ **Тон:** тонкий слой. Если нужно — лучше второй тонкий, чем один плотный."
+    concealer = "3️⃣ **Консилер:** точечно (покраснения/прыщики). Под глаза — тонко, только где темнота."
+    powder = "4️⃣ **Пудра:** только там, где блестит (обычно Т-зона)."
+    if a.skin == "dry":
+        powder = "4️⃣ **Пудра:** минимум (при желании — только Т-зона)."
+
+    blush = "5️⃣ **Румяна:** выше “яблочек” → к вискам (лифтинг)."
+    highlight = "6️⃣ **Высветлить (по желанию):** верх скулы, внутренний уголок глаза (чуть-чуть)."
+    contour = "7️⃣ **Затемнить (по желанию):** мягко под скулу и по линии роста волос (не в центр лица)."
+
+    extra = ""
+    if a.occasion == "date":
+        extra = "✨ Для свидания: оставь кожу живой, сделай мягкий румянец и нежные губы."
+    elif a.occasion == "party":
+        extra = "✨ Для праздника: можно добавить выразительность глазам, но без тяжёлого низа."
+    elif a.occasion == "photo":
+        extra = "✨ Для фото/видео: меньше сильного блеска, больше аккуратных матовых/сатиновых текстур."
+
+    return "\n".join([prep, tone, concealer, powder, blush, highlight, contour]) + ("\n\n" + extra if extra else "")
+
+
+# ===== Lips =====
+def lips_line(a: Answers) -> str:
+    if a.occasion == "party":
+        return "👄 **Губы:** нюд или чуть ярче (если глаза спокойные)."
+    if a.occasion == "date":
+        return "👄 **Губы:** мягкий нюд/блеск (женственно и свежо)."
+    if a.occasion == "photo":
+        return "👄 **Губы:** нюд без сильного глянца (чтобы не бликовало)."
+    return "👄 **Губы:** нюд/блеск по подтону."
+
+
+# ===== Mistakes =====
+def main_mistake(a: Answers) -> str:
+    if a.eyes == "hooded":
+        return "чёткая линия по складке и толстая стрелка — “съедают” веко"
+    if a.eyes == "small":
+        return "тёмные тени по всему веку и активный низ — уменьшают глаза"
+    if a.skin == "dry":
+        return "плотный матовый тон и много пудры — подчёркивают сухость"
+    if a.skin == "oily":
+        return "плотный тон толстым слоем — быстрее “поплывёт”"
+    if a.occasion == "photo":
+        return "крупный блеск/глиттер — часто выглядит неаккуратно в кадре"
+    return "перегружать лицо лишними слоями"
+
+
+# ===== Formula =====
+def formula_line(a: Answers) -> str:
+    if a.eyes == "small":
+        return "✨ **Формула:** свет внутри → тень снаружи → растушёвка вверх"
+    if a.eyes == "hooded":
+        return "✨ **Формула:** тень выше складки → мягкие линии → лифтинг вверх"
+    if a.eyes == "big":
+        return "✨ **Формула:** мягкая глубина → чистый низ → аккуратная тушь"
+    return "✨ **Формула:** свет на веко → тень во внешний угол → диагональ к виску"
+
+
+# ===== Build text =====
+def render_text(a: Answers, level: DetailLevel = "short") -> str:
+    set_id = pick_photo_set(a)
+    photo_links = image_links_for_set(set_id)
+
+    header = (
+        "💄 **Твой идеальный макияж (план):**\n\n"
+        f"**Кожа:** {skin_line(a.skin)}\n"
+        f"**Подтон:** {undertone_line(a.undertone)}\n"
+        f"**Глаза:** {eyes_short(a.eyes)}\n\n"
+        f"{palette_hint(a.undertone)}\n\n"
+        "📸 **Примеры макияжа (вдохновение):**\n"
+        f"{photo_links}\n"
+    )
+
+    if level == "short":
+        return (
+            header
+            + "\n**Схема (коротко):**\n"
+            "1️⃣ Подготовка кожи → тон тонко\n"
+            "2️⃣ Румяна выше скулы → к вискам\n"
+            "3️⃣ Глаза: свет внутри + тень снаружи (мягко)\n"
+            "4️⃣ Тушь: второй слой во внешний угол\n"
+            f"{lips_line(a)}\n\n"
+            f"❌ **Частая ошибка:** {main_mistake(a)}\n"
+            f"{formula_line(a)}\n\n"
+            "➡️ Нажми **«Подробнее»**, чтобы получить схему по зонам (где высветлить/затемнить)."
+        )
+
+    # full
+    return (
+        header
+        + "\n**Подробнее (пошагово):**\n"
+        + face_steps(a)
+        + "\n\n"
+        + eyes_full(a.eyes)
+        + "\n\n"
+        + lips_line(a)
+        + "\n\n"
+        + f"❌ **Частая ошибка:** {main_mistake(a)}\n"
+        + formula_line(a)
+    )
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+import pytest
+
+from app.db import DB, MIGRATIONS, AsyncDB, DBProfile
+from app.logic import ANSWERS_SPACE, Answers, decode_answers, tip_segment_of_code
+
+
+def _db(tmp_path) -> DB:
+    db = DB(str(tmp_path / "bot.sqlite3"))
+    db.init(DBProfile())
+    return db
+
+
+# ===== Tips claiming =====
+
+def test_claim_due_tips_in_chunks(tmp_path):
+    db = _db(tmp_path)
+    with db.conn:
+        db.conn.executemany(
+            "INSERT INTO users(chat_id, tips_enabled, tips_index, next_tip_at) VALUES (?, ?, 0, ?);",
+            [(chat_id, 1 if chat_id % 5 else 0, 100 if chat_id % 7 else 200) for chat_id in range(1, 1001)],
+        )
+    due = {chat_id for chat_id in range(1, 1001) if chat_id % 5 and chat_id % 7}
+
+    job_id = db.claim_due_tips("tips:150", 150, lambda now, *_: now + 1440, limit=64)
+
+    recipients = {r[0] for r in db.conn.execute("SELECT chat_id FROM broadcast_recipients WHERE job_id=?;", (job_id,))}
+    assert recipients == due
+    rescheduled = {
+        r[0] for r in db.conn.execute("SELECT chat_id FROM users WHERE next_tip_at = 1590;")
+    }
+    assert rescheduled == due
+    # Все перенесены — в ту же минуту новое задание не создаётся
+    assert db.claim_due_tips("tips:150b", 150, lambda now, *_: now + 1440) is None
+    db.close()
+
+
+def test_interrupted_claim_continues_without_duplicates(tmp_path):
+    db = _db(tmp_path)
+    with db.conn:
+        db.conn.executemany(
+            "INSERT INTO users(chat_id, tips_enabled, tips_index, next_tip_at) VALUES (?, 1, 0, 0);",
+            [(chat_id,) for chat_id in range(1, 101)],
+        )
+    reschedule = lambda now, *_: now + 1440  # noqa: E731
+    job_id = db.start_tips_job("tips:10", 10)
+    # «Упали» после первой порции
+    assert db.claim_tips_chunk(job_id, 10, reschedule, None, 30) == 30
+
+    assert db.claim_due_tips("tips:10", 10, reschedule, limit=30) == job_id
+    counts = db.conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT chat_id) FROM broadcast_recipients WHERE job_id=?;", (job_id,)
+    ).fetchone()
+    assert tuple(counts) == (100, 100)
+    db.close()
+
+
+# ===== Migration from the original schema =====
+
+# Схема и формат записей исходной версии бота (до PRAGMA user_version)
+BASELINE_SCHEMA = """
+    CREATE TABLE users (
+        chat_id INTEGER PRIMARY KEY,
+        tips_enabled INTEGER NOT NULL DEFAULT 0,
+        tips_index INTEGER NOT NULL DEFAULT 0,
+        last_result TEXT,
+        last_answers TEXT
+    );
+"""
+
+
+def _answers_json(a: Answers) -> str:
+    return json.dumps(
+        {"skin": a.skin, "tone": a.tone, "undertone": a.undertone, "eyes": a.eyes, "occasion": a.occasion},
+        ensure_ascii=False,
+    )
+
+
+def _baseline_db(path: str, rows) -> None:
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO users(chat_id, tips_enabled, tips_index, last_result, last_answers) VALUES (?, ?, ?, ?, ?);",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_migrates_baseline_json_answers_and_text_result(tmp_path):
+    path = str(tmp_path / "baseline.sqlite3")
+    rows = [
+        (code + 1, code % 2, code % 7, None, _answers_json(decode_answers(code)))
+        for code in range(ANSWERS_SPACE)
+    ]
+    rows += [
+        (10_001, 1, 3, "💄 сохранённый план", None),
+        (10_002, 0, 0, None, "{not json"),
+        (10_003, 0, 0, None, json.dumps({"skin": "dry"})),
+    ]
+    _baseline_db(path, rows)
+
+    db = DB(path)
+    db.init(DBProfile())
+    assert db.schema_version() == MIGRATIONS[-1][0]
+
+    for code in range(ANSWERS_SPACE):
+        migrated = db.get_last_answers(code + 1)
+        assert migrated == code
+        assert decode_answers(migrated) == decode_answers(code)
+    segments = dict(db.conn.execute("SELECT chat_id, tips_segment FROM users WHERE chat_id <= ?;", (ANSWERS_SPACE,)))
+    assert all(segments[code + 1] == tip_segment_of_code(code) for code in range(ANSWERS_SPACE))
+    assert db.get_tips_enabled(2) and not db.get_tips_enabled(1)
+
+    # Текстовый last_result остаётся доступен как сохранённый план
+    assert db.get_last_result(10_001) == "💄 сохранённый план"
+    plan = db.get_saved_plan(10_001)
+    assert plan.answers_code is None and plan.text == "💄 сохранённый план"
+    # Битые ответы не ломают миграцию
+    assert db.get_last_answers(10_002) is None
+    assert db.get_last_answers(10_003) is None
+    db.close()
+
+
+def test_reads_json_answers_written_after_migration(tmp_path):
+    # Старая копия бота (например, при выкатке) ещё пишет JSON в last_answers
+    db = _db(tmp_path)
+    a = Answers(skin="oily", tone="tan", undertone="cool", eyes="hooded", occasion="party")
+    with db.conn:
+        db.conn.execute("INSERT INTO users(chat_id, last_answers) VALUES (1, ?);", (_answers_json(a),))
+    assert decode_answers(db.get_last_answers(1)) == a
+    db.close()
+
+
+def test_migrates_db_without_last_answers_column(tmp_path):
+    path = str(tmp_path / "oldest.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE users (chat_id INTEGER PRIMARY KEY, tips_enabled INTEGER NOT NULL DEFAULT 0, "
+        "tips_index INTEGER NOT NULL DEFAULT 0, last_result TEXT);"
+    )
+    conn.execute("INSERT INTO users(chat_id, tips_enabled, last_result) VALUES (1, 1, 'plan');")
+    conn.commit()
+    conn.close()
+
+    db = DB(path)
+    db.init(DBProfile())
+    assert db.get_last_answers(1) is None
+    assert db.get_last_result(1) == "plan"
+    assert db.get_tips_enabled(1)
+    db.close()
+
+
+# ===== AsyncDB write-behind =====
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _on_disk(path: str, chat_id: int, column: str):
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute(f"SELECT {column} FROM users WHERE chat_id=?;", (chat_id,)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+@pytest.mark.parametrize("durability", ["batched", "off"])
+def test_async_db_reads_its_own_pending_writes(tmp_path, durability):
+    path = str(tmp_path / "bot.sqlite3")
+
+    async def scenario():
+        # Интервал большой — сам по себе ничего не сбросится
+        db = AsyncDB(path, profile=DBProfile(), durability=durability, flush_interval=60)
+        await db.init()
+        await db.save_last_answers(1, 42)
+        await db.set_tips(1, True)
+        await db.save_last_result(2, "план")
+        assert db.pending == 2
+        assert await db.get_last_answers(1) == 42
+        assert await db.get_tips_enabled(1)
+        assert await db.get_last_result(2) == "план"
+        # На диске ещё ничего нет
+        assert _on_disk(path, 1, "last_answers_code") is None
+        await db.flush()
+        assert db.pending == 0
+        assert _on_disk(path, 1, "last_answers_code") == 42
+        assert await db.get_last_answers(1) == 42
+        await db.close()
+
+    _run(scenario())
+
+
+def test_async_db_failed_flush_requeues_and_keeps_newer_values(tmp_path):
+    path = str(tmp_path / "bot.sqlite3")
+
+    async def scenario():
+        db = AsyncDB(path, profile=DBProfile(), durability="batched", flush_interval=60)
+        await db.init()
+        apply_batch = db._db.apply_batch
+
+        def failing(batch):
+            time.sleep(0.1)
+            raise sqlite3.OperationalError("database is locked")
+
+        db._db.apply_batch = failing
+        await db.save_last_answers(1, 10)
+        await db.set_tips(1, True)
+        flush = asyncio.create_task(db.flush())
+        await asyncio.sleep(0.02)
+        # Пока сброс «висит», пользователь успел ответить заново
+        await db.save_last_answers(1, 11)
+        with pytest.raises(sqlite3.OperationalError):
+            await flush
+
+        assert db.pending == 1
+        assert await db.get_last_answers(1) == 11
+        assert await db.get_tips_enabled(1)
+
+        db._db.apply_batch = apply_batch
+        await db.flush()
+        assert _on_disk(path, 1, "last_answers_code") == 11
+        assert _on_disk(path, 1, "tips_enabled") == 1
+        await db.close()
+
+    _run(scenario())
+
+
+@pytest.mark.parametrize("durability", ["batched", "off"])
+def test_async_db_close_flushes_pending_writes(tmp_path, durability):
+    path = str(tmp_path / "bot.sqlite3")
+
+    async def scenario():
+        db = AsyncDB(path, profile=DBProfile(), durability=durability, flush_interval=60)
+        await db.init()
+        for chat_id in range(1, 101):
+            await db.save_last_answers(chat_id, chat_id)
+        await db.set_tips(7, True)
+        assert db.pending == 100
+        await db.close()
+
+    _run(scenario())
+    db = DB(path)
+    assert [db.get_last_answers(chat_id) for chat_id in range(1, 101)] == list(range(1, 101))
+    assert db.get_tips_enabled(7)
+    db.close()
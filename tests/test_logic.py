@@ -0,0 +1,19 @@
+from dataclasses import replace
+
+import pytest
+
+from app.logic import ANSWERS_SPACE, LEVEL_OPTIONS, build_text, decode_answers, render_text
+
+
+# Готовая таблица текстов должна совпадать с прямым рендером для каждого кода и уровня
+@pytest.mark.parametrize("level", LEVEL_OPTIONS)
+def test_build_text_matches_render_text(level):
+    for code in range(ANSWERS_SPACE):
+        a = decode_answers(code)
+        assert build_text(a, level) == render_text(a, level), (code, level)
+
+
+def test_build_text_unknown_answers_fall_back_to_render():
+    a = replace(decode_answers(0), occasion="other")
+    for level in LEVEL_OPTIONS:
+        assert build_text(a, level) == render_text(a, level)
@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.dispatcher.event.bases import CancelHandler
+
+from app import metrics
+
+
+@pytest.fixture
+def enabled_metrics():
+    metrics.REGISTRY.enabled = True
+    yield
+    metrics.REGISTRY.enabled = False
+
+
+def _call(handler, data: str):
+    middleware = metrics.HandlerMetricsMiddleware()
+    return asyncio.run(middleware(handler, SimpleNamespace(data=data), {}))
+
+
+def test_cancelled_update_is_timed_not_counted_as_error(enabled_metrics):
+    async def handler(event, data):
+        raise CancelHandler()
+
+    errors = metrics.HANDLER_ERRORS.value("mt_cancel")
+    count = metrics.HANDLER_SECONDS._values.get(("cancelled",), [None, 0, 0])[2]
+    with pytest.raises(CancelHandler):
+        _call(handler, "mt_cancel")
+    assert metrics.HANDLER_ERRORS.value("mt_cancel") == errors
+    assert metrics.HANDLER_SECONDS._values[("cancelled",)][2] == count + 1
+
+
+def test_handler_exception_is_counted(enabled_metrics):
+    async def handler(event, data):
+        raise RuntimeError("boom")
+
+    errors = metrics.HANDLER_ERRORS.value("mt_error")
+    with pytest.raises(RuntimeError):
+        _call(handler, "mt_error")
+    assert metrics.HANDLER_ERRORS.value("mt_error") == errors + 1
@@ -0,0 +1,32 @@
+from dataclasses import replace
+
+import pytest
+
+from app import logic
+from app.logic import ANSWERS_SPACE, LEVEL_OPTIONS, build_text, decode_answers
+
+from . import reference_logic as reference
+
+
+# Правила из content.json, скомпилированные в таблицы, против исходных if-цепочек
+@pytest.mark.parametrize("level", LEVEL_OPTIONS)
+def test_compiled_rules_reproduce_build_text(level):
+    for code in range(ANSWERS_SPACE):
+        a = decode_answers(code)
+        assert build_text(a, level) == reference.render_text(a, level), (code, level)
+
+
+@pytest.mark.parametrize(
+    "name", ["pick_photo_set", "face_steps", "lips_line", "main_mistake", "formula_line"]
+)
+def test_rules_match_reference_per_part(name):
+    for code in range(ANSWERS_SPACE):
+        a = decode_answers(code)
+        assert getattr(logic, name)(a) == getattr(reference, name)(a), (name, code)
+
+
+def test_rules_outside_table_match_reference():
+    # Нестандартный вариант ответа — не в таблице, правила перебираются по порядку
+    a = replace(decode_answers(0), occasion="other")
+    for level in LEVEL_OPTIONS:
+        assert build_text(a, level) == reference.render_text(a, level)
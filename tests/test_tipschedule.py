@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.tipschedule import TipSchedule, next_local_minute, parse_hhmm, parse_tz_args, zone
+
+BERLIN = zone("Europe/Berlin")
+
+
+def utc_minute(*args) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp() // 60)
+
+
+def local(minute: int, tz=BERLIN) -> datetime:
+    return datetime.fromtimestamp(minute * 60, tz)
+
+
+# ===== next_local_minute =====
+
+def test_next_local_minute_today_and_tomorrow():
+    # 2026-06-01 06:00 UTC = 08:00 в Берлине (CEST, +2)
+    now = utc_minute(2026, 6, 1, 6, 0)
+    assert local(next_local_minute(now, BERLIN, 9 * 60)) == datetime(2026, 6, 1, 9, 0, tzinfo=BERLIN)
+    assert local(next_local_minute(now, BERLIN, 7 * 60)) == datetime(2026, 6, 2, 7, 0, tzinfo=BERLIN)
+
+
+def test_next_local_minute_is_strictly_after_now():
+    now = utc_minute(2026, 6, 1, 7, 0)  # ровно 09:00 в Берлине
+    at = next_local_minute(now, BERLIN, 9 * 60)
+    assert at > now
+    assert local(at) == datetime(2026, 6, 2, 9, 0, tzinfo=BERLIN)
+
+
+def test_spring_forward_gap_moves_to_existing_time():
+    # 2026-03-29: в Берлине 02:00 CET → 03:00 CEST, 02:30 не существует
+    now = utc_minute(2026, 3, 28, 23, 0)
+    at = next_local_minute(now, BERLIN, 2 * 60 + 30)
+    assert at == utc_minute(2026, 3, 29, 1, 30)  # 03:30 CEST — через час после «пропавшего» 02:30
+    # Следующий раз — снова 02:30, уже по летнему времени
+    assert next_local_minute(at, BERLIN, 2 * 60 + 30) == utc_minute(2026, 3, 30, 0, 30)
+
+
+def test_fall_back_overlap_delivers_once():
+    # 2026-10-25: в Берлине 03:00 CEST → 02:00 CET, 02:30 бывает дважды
+    now = utc_minute(2026, 10, 24, 22, 0)
+    first = next_local_minute(now, BERLIN, 2 * 60 + 30)
+    assert first == utc_minute(2026, 10, 25, 0, 30)  # первое 02:30 (CEST)
+    # После отправки второе 02:30 того же дня (01:30 UTC) пропускаем — следующий раз завтра
+    again = next_local_minute(first, BERLIN, 2 * 60 + 30)
+    assert again == utc_minute(2026, 10, 26, 1, 30)
+    # Между двумя 02:30 (02:00 по зимнему времени) — тоже только завтра, не второй раз за день
+    assert next_local_minute(utc_minute(2026, 10, 25, 1, 0), BERLIN, 2 * 60 + 30) == again
+
+
+def test_rescheduling_every_day_keeps_local_time_across_dst():
+    schedule = TipSchedule("Europe/Berlin", base_minute=9 * 60)
+    at = utc_minute(2026, 3, 20, 0, 0)
+    for _ in range(20):
+        at = schedule.next_at(at, 1, "Europe/Berlin", 9 * 60)
+        assert (local(at).hour, local(at).minute) == (9, 0)
+
+
+def test_default_minute_spreads_over_window():
+    schedule = TipSchedule("Europe/Moscow", base_minute=23 * 60 + 30, window=120)
+    minutes = {schedule.default_minute(chat_id) for chat_id in range(1, 2001)}
+    # Окно переходит через полночь: 23:30..01:29
+    assert minutes == {m % 1440 for m in range(23 * 60 + 30, 23 * 60 + 150)}
+    assert schedule.minute_for(5, 600) == 600
+    assert schedule.zone_for("Not/AZone") == zone("Europe/Moscow")
+
+
+# ===== /tz arguments =====
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("09:30", 570), ("0:00", 0), ("23:59", 1439), ("24:00", None), ("9:60", None), ("0930", None), ("a:b", None)],
+)
+def test_parse_hhmm(value, expected):
+    assert parse_hhmm(value) == expected
+
+
+@pytest.mark.parametrize(
+    "args, expected",
+    [
+        (["Europe/Berlin"], ("Europe/Berlin", None)),
+        (["Europe/Berlin", "08:15"], ("Europe/Berlin", 495)),
+        (["Mars/Olympus"], None),
+        (["../etc/passwd"], None),
+        (["Europe/Berlin", "8.15"], None),
+        (["Europe/Berlin", "08:15", "extra"], None),
+        ([], None),
+    ],
+)
+def test_parse_tz_args(args, expected):
+    assert parse_tz_args(args) == expected